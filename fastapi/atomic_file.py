@@ -0,0 +1,38 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+########################################################
+# Files written atomically
+########################################################
+@contextmanager
+def atomic_path(path):
+    """
+    Method used to write a file atomically: the content is written to a
+    temporary file with a unique name in the same folder, which replaces the
+    file at the end. A reader never sees a partial file, and several workers
+    writing the same file at startup don't share their temporary file. The
+    temporary file is removed on failure.
+
+    Parameters:
+    -----------------
+        path (str): Path of the file
+
+    Returns:
+    -----------------
+        tmp_path (str): Path to write the content to
+    """
+
+    folder, name = os.path.split(os.path.abspath(path))
+
+    with tempfile.NamedTemporaryFile(dir=folder, prefix=name + ".", suffix=".tmp", delete=False) as f:
+        tmp_path = f.name
+
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,78 @@
+import asyncio
+
+
+########################################################
+# Micro-batching of concurrent requests
+########################################################
+class MicroBatcher:
+    """
+    Class used to group the items submitted by concurrent requests and
+    process them with a single call, e.g. one vectorized predict_proba.
+
+    A batch is processed when it reaches max_batch_size items or when its
+    first item waited max_latency seconds. Items are grouped by key, only
+    the items with the same key (e.g. the same model) are processed together.
+
+    Parameters:
+    -----------------
+        process (coroutine function): Receives (key, items) and returns one
+                                      result by item, in the same order
+        max_batch_size (int): Maximum number of items by batch
+        max_latency (float): Maximum seconds waited by the first item
+    """
+
+    def __init__(self, process, max_batch_size=64, max_latency=0.005):
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._batches = {}
+        self._timers = {}
+
+    async def submit(self, key, item):
+        """
+        Method used to add an item to the next batch and wait for its result.
+
+        Parameters:
+        -----------------
+            key (hashable): Items are only batched with the same key
+            item (object): Item to process
+
+        Returns:
+        -----------------
+            result (object): Result of the item, or the exception raised by process
+        """
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._batches.setdefault(key, [])
+        batch.append((item, future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_latency, self._flush, key)
+
+        return await future
+
+    def _flush(self, key):
+        batch = self._batches.pop(key, None)
+        timer = self._timers.pop(key, None)
+
+        if timer is not None:
+            timer.cancel()
+
+        if batch:
+            asyncio.ensure_future(self._run(key, batch))
+
+    async def _run(self, key, batch):
+        try:
+            results = await self.process(key, [item for item, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
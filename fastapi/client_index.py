@@ -0,0 +1,122 @@
+import numpy as np
+
+
+########################################################
+# Client's id index
+########################################################
+class ClientIndex:
+    """
+    Class used to find the row position of a client in constant time.
+
+    The index is built once from the SK_ID_CURR column, so the EndPoints
+    don't scan the whole list of ids nor filter the whole DataFrame. The
+    ids are also kept sorted to list them by page and search them by prefix
+    with binary searches.
+
+    Parameters:
+    -----------------
+        ids (1d array-like): SK_ID_CURR values in the row order of the DataFrame
+    """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.sorted_ids = np.sort(self.ids)
+        self._positions = {client_id: position for position, client_id in enumerate(self.ids.tolist())}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, client_id):
+        return client_id in self._positions
+
+    def position(self, client_id):
+        """
+        Method used to get the row position of a client.
+
+        Parameters:
+        -----------------
+            client_id (int): Client's SK_ID_CURR
+
+        Returns:
+        -----------------
+            position (int): Row position in the DataFrame, None if the id is unknown
+        """
+
+        return self._positions.get(client_id)
+
+    def prefix_ranges(self, prefix):
+        """
+        Method used to get the ranges of ids starting with a prefix, e.g. 12
+        gives [12, 12], [120, 129], [1200, 1299]... up to the largest id.
+
+        Parameters:
+        -----------------
+            prefix (str): Digits the ids start with, all the ids if empty
+
+        Returns:
+        -----------------
+            ranges (list): (first, last) ids of each range, in ascending order
+        """
+
+        if not len(self.sorted_ids):
+            return []
+
+        largest = int(self.sorted_ids[-1])
+
+        if not prefix:
+            return [(int(self.sorted_ids[0]), largest)]
+
+        # 0 is only a prefix of itself, no id is written with a leading zero
+        if prefix.startswith("0"):
+            return [(0, 0)] if prefix == "0" else []
+
+        first = int(prefix)
+
+        ranges = []
+        width = 1
+        while first * width <= largest:
+            ranges.append((first * width, (first + 1) * width - 1))
+            width *= 10
+
+        return ranges
+
+    def page(self, prefix="", cursor=None, limit=100):
+        """
+        Method used to list the ids in ascending order, page by page.
+
+        Parameters:
+        -----------------
+            prefix (str): Digits the ids start with, all the ids if empty
+            cursor (int): Last id of the previous page, None for the first page
+            limit (int): Maximum number of ids
+
+        Returns:
+        -----------------
+            (ids, next_cursor): Ids of the page and cursor of the next one,
+                                None when it is the last page
+        """
+
+        pages = []
+        size = 0
+
+        for first, last in self.prefix_ranges(prefix):
+            if cursor is not None:
+                first = max(first, cursor + 1)
+            if first > last:
+                continue
+
+            start = np.searchsorted(self.sorted_ids, first, side="left")
+            stop = np.searchsorted(self.sorted_ids, last, side="right")
+
+            # One more id than the limit tells whether there is a next page
+            pages.append(self.sorted_ids[start:min(stop, start + limit + 1 - size)])
+            size += len(pages[-1])
+            if size > limit:
+                break
+
+        ids = np.concatenate(pages) if pages else self.sorted_ids[:0]
+
+        if len(ids) > limit:
+            return ids[:limit].tolist(), int(ids[limit - 1])
+
+        return ids.tolist(), None
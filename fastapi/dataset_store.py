@@ -0,0 +1,139 @@
+import os
+import sys
+import pandas as pd
+import pyarrow.feather as feather
+from atomic_file import atomic_path
+
+
+########################################################
+# Columnar datasets
+########################################################
+def columnar_path(csv_path):
+    """
+    Method used to get the path of the columnar copy of a CSV.
+
+    Parameters:
+    -----------------
+        csv_path (str): Path of the CSV
+
+    Returns:
+    -----------------
+        path (str): Same path with the .feather extension
+    """
+
+    return os.path.splitext(csv_path)[0] + ".feather"
+
+
+def convert_csv(csv_path, path=None, keep_float64=()):
+    """
+    Method used to convert a CSV to an uncompressed Feather file (Arrow IPC),
+    which can be memory-mapped. The float64 columns are saved as float32.
+
+    Parameters:
+    -----------------
+        csv_path (str): Path of the CSV
+        path (str): Path of the Feather file, by default next to the CSV
+        keep_float64 (list): Columns kept as float64, e.g. the ones displayed
+
+    Returns:
+    -----------------
+        path (str): Path of the Feather file
+    """
+
+    path = path or columnar_path(csv_path)
+
+    df = pd.read_csv(csv_path)
+
+    for col in df.columns:
+        if df[col].dtype == "float64" and col not in keep_float64:
+            df[col] = df[col].astype("float32")
+
+    with atomic_path(path) as tmp_path:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+
+    return path
+
+
+class ColumnarDataset:
+    """
+    Class used to read a dataset saved as Feather through a memory map, the
+    columns are only materialized when they are requested.
+
+    Parameters:
+    -----------------
+        path (str): Path of the Feather file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.table = feather.read_table(path, memory_map=True)
+
+    @classmethod
+    def from_csv(cls, csv_path, keep_float64=()):
+        """
+        Method used to open the columnar copy of a CSV, it is created (or
+        refreshed when the CSV is newer) the first time.
+
+        Parameters:
+        -----------------
+            csv_path (str): Path of the CSV
+            keep_float64 (list): Columns kept as float64 during the conversion
+
+        Returns:
+        -----------------
+            dataset (ColumnarDataset): Dataset memory-mapped
+        """
+
+        path = columnar_path(csv_path)
+
+        if not os.path.isfile(path) or (
+            os.path.isfile(csv_path) and os.path.getmtime(path) < os.path.getmtime(csv_path)
+        ):
+            convert_csv(csv_path, path, keep_float64)
+
+        return cls(path)
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def to_pandas(self, columns=None):
+        """
+        Method used to get some columns as a DataFrame.
+
+        Parameters:
+        -----------------
+            columns (list): Columns to read, all by default
+
+        Returns:
+        -----------------
+            df (pandas.DataFrame): Columns requested
+        """
+
+        table = self.table if columns is None else self.table.select(columns)
+
+        return table.to_pandas()
+
+    def column(self, name):
+        """
+        Method used to get a single column as a NumPy array.
+
+        Parameters:
+        -----------------
+            name (str): Column to read
+
+        Returns:
+        -----------------
+            values (numpy.ndarray): Values of the column, null as NaN
+        """
+
+        return self.table.column(name).to_numpy()
+
+
+if __name__ == "__main__":
+    # Converting the CSVs given, e.g. python dataset_store.py datasets/*.csv
+    for csv_path in sys.argv[1:]:
+        print("{} -> {}".format(csv_path, convert_csv(csv_path)))
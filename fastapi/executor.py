@@ -0,0 +1,256 @@
+import time
+import asyncio
+import multiprocessing
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import joblib
+import shap
+from tree_engine import TreeEnsemble, lightgbm_booster
+from explanations import class_one
+
+
+########################################################
+# Tasks, module functions so they can run in a process too
+########################################################
+_models = {}
+_explainers = {}
+
+
+def load_model(path):
+    """
+    Method used by a worker process to keep in memory the last model used.
+
+    Parameters:
+    -----------------
+        path (str): Path of the model's pickle, or of its compiled trees (.npz)
+
+    Returns:
+    -----------------
+        model (object): Model loaded
+    """
+
+    model = _models.get(path)
+
+    if model is None:
+        _models.clear()
+        model = _models[path] = TreeEnsemble.load(path) if path.endswith(".npz") else joblib.load(path)
+
+    return model
+
+
+def predict_proba_task(model, X):
+    """
+    Method used to predict the probabilities in a worker.
+
+    Parameters:
+    -----------------
+        model (object or str): Model, or path of its pickle (or compiled trees) in a process pool
+        X (pandas.DataFrame): Features in the training order
+
+    Returns:
+    -----------------
+        result_proba (numpy.ndarray): Probabilities of the class 0 and 1
+    """
+
+    if isinstance(model, str):
+        model = load_model(model)
+
+    return model.predict_proba(X)
+
+
+def load_explainer(model):
+    """
+    Method used by a worker to keep in memory the explainers of the last
+    model explained, the exact TreeExplainer and the compiled trees used
+    for the approximation.
+
+    Parameters:
+    -----------------
+        model (object or str): Model, or path of its pickle in a process pool
+
+    Returns:
+    -----------------
+        (explainer, trees): shap.TreeExplainer and TreeEnsemble of the model
+    """
+
+    key = model if isinstance(model, str) else id(model)
+    cached = _explainers.get(key)
+
+    # The model is kept in the cache, so its id can't be reused meanwhile
+    if cached is None or (not isinstance(model, str) and cached[0] is not model):
+        _explainers.clear()
+        booster = lightgbm_booster(joblib.load(model) if isinstance(model, str) else model)
+        cached = _explainers[key] = (model, shap.TreeExplainer(booster), TreeEnsemble.from_model(booster))
+
+    return cached[1], cached[2]
+
+
+def shap_values_task(model, X, approximate=False):
+    """
+    Method used to compute the SHAP values of the class 1 in a worker.
+
+    Parameters:
+    -----------------
+        model (object or str): Model, or path of its pickle in a process pool
+        X (numpy.ndarray): Features in the training order
+        approximate (bool): Saabas contributions instead of the exact values
+
+    Returns:
+    -----------------
+        (values, expected_value): Values of shape (rows, features) and base value
+    """
+
+    explainer, trees = load_explainer(model)
+
+    if approximate:
+        return trees.predict_contrib_approximate(X)
+
+    return class_one(explainer.shap_values(X)), float(class_one(explainer.expected_value))
+
+
+def records_json_task(df):
+    """
+    Method used to serialize a DataFrame as JSON records in a worker.
+
+    Parameters:
+    -----------------
+        df (pandas.DataFrame): Rows to serialize
+
+    Returns:
+    -----------------
+        records (str): JSON records
+    """
+
+    return df.to_json(orient="records")
+
+
+def _timed_call(fn, args):
+    started = time.time()
+    result = fn(*args)
+
+    return result, started, time.time()
+
+
+########################################################
+# Inference executor
+########################################################
+Timing = namedtuple("Timing", ["queue_wait", "compute"])
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when the executor already has the maximum of tasks waiting.
+    """
+
+
+class InferenceExecutor:
+    """
+    Class used to run the CPU-bound work (inference, explanations) out of
+    the event loop, in a thread or a process pool with a bounded queue.
+
+    Parameters:
+    -----------------
+        kind (str): "thread" or "process"
+        max_workers (int): Number of workers of the pool
+        max_queue (int): Maximum of tasks waiting for a worker, more tasks
+                         raise ExecutorSaturated instead of waiting
+    """
+
+    def __init__(self, kind="thread", max_workers=4, max_queue=32):
+        if kind not in ("thread", "process"):
+            raise ValueError("kind must be thread or process")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        if kind == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            # Not fork: the API process already ran LightGBM (OpenMP), a forked
+            # worker can hang on its first prediction. The workers load the
+            # model from its path
+            self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # Metrics since the start
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.compute_total = 0.0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                return False
+            self._pending += 1
+            return True
+
+    def _release(self, timing):
+        with self._lock:
+            self._pending -= 1
+            if timing is not None:
+                self.completed += 1
+                self.queue_wait_total += timing.queue_wait
+                self.compute_total += timing.compute
+
+    async def run(self, fn, *args):
+        """
+        Method used to run a function in the pool.
+
+        Parameters:
+        -----------------
+            fn (function): Function to run, a module function for a process pool
+            *args: Arguments of the function, picklable for a process pool
+
+        Returns:
+        -----------------
+            (result, timing): Result of the function and Timing with the
+                              seconds waiting for a worker and computing
+        """
+
+        if not self._acquire():
+            raise ExecutorSaturated("inference executor saturated")
+
+        timing = None
+        try:
+            submitted = time.time()
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(self._pool, _timed_call, fn, args)
+            timing = Timing(max(started - submitted, 0.0), finished - started)
+        finally:
+            self._release(timing)
+
+        return result, timing
+
+    def stats(self):
+        """
+        Method used to get the metrics of the executor.
+
+        Returns:
+        -----------------
+            stats (dict): Configuration, tasks pending and mean timings
+        """
+
+        completed = max(self.completed, 1)
+
+        return {
+            "kind" : self.kind,
+            "maxWorkers" : self.max_workers,
+            "maxQueue" : self.max_queue,
+            "pending" : self._pending,
+            "completed" : self.completed,
+            "rejected" : self.rejected,
+            "meanQueueWaitMs" : 1000 * self.queue_wait_total / completed,
+            "meanComputeMs" : 1000 * self.compute_total / completed
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
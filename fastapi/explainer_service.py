@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+from collections import OrderedDict, namedtuple
+import numpy as np
+from batcher import MicroBatcher
+
+
+########################################################
+# On-demand explanations of arbitrary feature rows
+########################################################
+Explanation = namedtuple("Explanation", ["values", "expected_value", "approximate", "cached"])
+
+
+def row_hash(row):
+    """
+    Method used to get a key identifying a feature row, the NaN and the
+    zeros are normalized so that equal rows have the same key.
+
+    Parameters:
+    -----------------
+        row (numpy.ndarray): Features in the training order
+
+    Returns:
+    -----------------
+        key (bytes): Digest of the row's values
+    """
+
+    row = np.asarray(row, dtype=np.float64) + 0.0
+    row[np.isnan(row)] = np.nan
+
+    return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+
+class ExplainerService:
+    """
+    Class used to explain feature rows not in the precomputed SHAP values,
+    e.g. new applicants.
+
+    The explanations are kept in a LRU cache keyed by model's version and
+    row's hash. The rows missing from the cache are grouped with the ones
+    of concurrent requests and computed by a single call. With a time
+    budget, the approximate contributions are computed instead when the
+    exact ones are expected to take longer.
+
+    Parameters:
+    -----------------
+        compute (coroutine function): Receives (active, X, approximate) and
+                                      returns (values, expected_value, seconds)
+        max_entries (int): Maximum number of rows kept in the cache
+        max_batch_size (int): Maximum number of rows computed together
+        max_latency (float): Maximum seconds waited to group the rows
+    """
+
+    def __init__(self, compute, max_entries=4096, max_batch_size=64, max_latency=0.005):
+        self.compute = compute
+        self.max_entries = max_entries
+        self.batcher = MicroBatcher(self._process, max_batch_size, max_latency)
+        self._cache = OrderedDict()
+
+        # Mean seconds by row of the exact computation, None until the first one
+        self.exact_seconds_by_row = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, approximate):
+        entry = self._cache.get(key)
+
+        # An exact explanation can answer an approximate request, not the opposite
+        if entry is None or (entry.approximate and not approximate):
+            return None
+
+        self._cache.move_to_end(key)
+
+        return entry
+
+    def _put(self, key, entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def _process(self, batch_key, rows):
+        active, approximate = batch_key
+
+        values, expected_value, seconds = await self.compute(active, np.vstack(rows), approximate)
+
+        if not approximate:
+            seconds_by_row = seconds / len(rows)
+            self.exact_seconds_by_row = seconds_by_row if self.exact_seconds_by_row is None else (
+                0.8 * self.exact_seconds_by_row + 0.2 * seconds_by_row
+            )
+
+        return [(row_values, expected_value) for row_values in values]
+
+    async def explain(self, active, X, approximate=False, budget=None):
+        """
+        Method used to explain feature rows with a model.
+
+        Parameters:
+        -----------------
+            active (ActiveModel): Model and version to use
+            X (numpy.ndarray): Features in the training order, a row by client
+            approximate (bool): Accepting approximate contributions
+            budget (float): Seconds, the rows are approximated when the exact
+                            computation is expected to take longer
+
+        Returns:
+        -----------------
+            explanations (list): An Explanation by row
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+        keys = [(active.version, row_hash(row)) for row in X]
+
+        explanations = [self._get(key, approximate) for key in keys]
+        missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing and not approximate and budget is not None and self.exact_seconds_by_row is not None:
+            approximate = len(missing) * self.exact_seconds_by_row > budget
+
+        results = await asyncio.gather(*[self.batcher.submit((active, approximate), X[i]) for i in missing])
+
+        for i, (values, expected_value) in zip(missing, results):
+            explanation = Explanation(values.astype(np.float32), expected_value, approximate, False)
+            self._put(keys[i], explanation)
+            explanations[i] = explanation
+
+        computed = set(missing)
+
+        return [
+            explanation if i in computed else explanation._replace(cached=True)
+            for i, explanation in enumerate(explanations)
+        ]
+
+    def stats(self):
+        """
+        Method used to get the metrics of the cache.
+
+        Returns:
+        -----------------
+            stats (dict): Size of the cache, hits, misses and mean exact time
+        """
+
+        return {
+            "entries" : len(self._cache),
+            "maxEntries" : self.max_entries,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "exactMsByRow" : None if self.exact_seconds_by_row is None else 1000 * self.exact_seconds_by_row
+        }
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import numpy as np
+import joblib
+from atomic_file import atomic_path
+
+
+########################################################
+# SHAP values store
+########################################################
+def class_one(values):
+    """
+    Method used to keep only the SHAP values (or expected value) of the
+    class 1, the shap versions return a list by class or a single array.
+
+    Parameters:
+    -----------------
+        values (list or numpy.ndarray): Output of TreeExplainer
+
+    Returns:
+    -----------------
+        values (numpy.ndarray): Values of the class 1
+    """
+
+    if isinstance(values, list):
+        return np.asarray(values[1])
+
+    values = np.asarray(values)
+
+    # (rows, features, classes) in the recent versions of shap
+    if values.ndim == 3 or (values.ndim == 1 and len(values) == 2):
+        return values[..., 1]
+
+    return values
+
+
+def store_paths(path):
+    """
+    Method used to get the paths of the store of a SHAP values' pickle.
+
+    Parameters:
+    -----------------
+        path (str): Path of the pickle, e.g. shap_models/shap_values_20220220.pkl
+
+    Returns:
+    -----------------
+        (values_path, metadata_path): Matrix (.npy) and expected value (.json)
+    """
+
+    base = os.path.splitext(path)[0]
+
+    return base + ".npy", base + ".json"
+
+
+def convert_pickles(shap_values_path, explainer_path):
+    """
+    Method used to convert the pickles of the SHAP values and of the explainer
+    to a float32 matrix of the class 1, which can be memory-mapped, and a
+    JSON with the expected value.
+
+    Parameters:
+    -----------------
+        shap_values_path (str): Pickle of the SHAP values of all the clients
+        explainer_path (str): Pickle of the TreeExplainer
+
+    Returns:
+    -----------------
+        (values_path, metadata_path): Paths of the store
+    """
+
+    values_path, metadata_path = store_paths(shap_values_path)
+
+    values = class_one(joblib.load(shap_values_path)).astype(np.float32)
+    expected_value = float(class_one(joblib.load(explainer_path).expected_value))
+
+    # The metadata last, the store is complete once it exists
+    with atomic_path(values_path) as tmp_path, open(tmp_path, "wb") as f:
+        np.save(f, values)
+    with atomic_path(metadata_path) as tmp_path, open(tmp_path, "w") as f:
+        json.dump({"expectedValue": expected_value, "shape": list(values.shape)}, f)
+
+    return values_path, metadata_path
+
+
+class ShapStore:
+    """
+    Class used to read the SHAP values of the class 1 through a memory map,
+    only the rows of the clients requested are read from the disk.
+
+    Parameters:
+    -----------------
+        values_path (str): Matrix (.npy) of the SHAP values, a row by client
+        metadata_path (str): JSON with the expected value
+        features (list): Features' names, in the columns' order
+    """
+
+    def __init__(self, values_path, metadata_path, features):
+        self.values = np.load(values_path, mmap_mode="r")
+
+        with open(metadata_path) as f:
+            self.expected_value = json.load(f)["expectedValue"]
+
+        if self.values.shape[1] != len(features):
+            raise ValueError("{} SHAP values by client for {} features".format(self.values.shape[1], len(features)))
+
+        self.features = list(features)
+
+    @classmethod
+    def from_pickles(cls, shap_values_path, explainer_path, features):
+        """
+        Method used to open the store of the SHAP values' pickle, it is created
+        (or refreshed when the pickle is newer) the first time.
+
+        Parameters:
+        -----------------
+            shap_values_path (str): Pickle of the SHAP values of all the clients
+            explainer_path (str): Pickle of the TreeExplainer
+            features (list): Features' names, in the columns' order
+
+        Returns:
+        -----------------
+            store (ShapStore): SHAP values memory-mapped
+        """
+
+        values_path, metadata_path = store_paths(shap_values_path)
+
+        if not os.path.isfile(values_path) or not os.path.isfile(metadata_path) or (
+            os.path.isfile(shap_values_path) and os.path.getmtime(values_path) < os.path.getmtime(shap_values_path)
+        ):
+            convert_pickles(shap_values_path, explainer_path)
+
+        return cls(values_path, metadata_path, features)
+
+    def __len__(self):
+        return len(self.values)
+
+    def top_contributions(self, position, top=10):
+        """
+        Method used to get the features contributing the most to the
+        prediction of a client, by absolute SHAP value.
+
+        Parameters:
+        -----------------
+            position (int): Client's row
+            top (int): Number of features
+
+        Returns:
+        -----------------
+            (indices, values, others): See top_contributions
+        """
+
+        return top_contributions(self.values[position], top)
+
+
+def top_contributions(row, top=10):
+    """
+    Method used to get the features contributing the most to a prediction,
+    by absolute SHAP value.
+
+    Parameters:
+    -----------------
+        row (numpy.ndarray): SHAP values of a client
+        top (int): Number of features
+
+    Returns:
+    -----------------
+        (indices, values, others): Features' indices and SHAP values sorted
+                                   by absolute value, and the sum of the rest
+    """
+
+    row = np.asarray(row, dtype=np.float64)
+    top = min(top, len(row))
+
+    indices = np.argpartition(-np.abs(row), top - 1)[:top]
+    indices = indices[np.argsort(-np.abs(row[indices]), kind="stable")]
+
+    return indices, row[indices], float(row.sum() - row[indices].sum())
+
+
+if __name__ == "__main__":
+    # python explanations.py shap_models/shap_values_20220220.pkl shap_models/explainer_20220220.pkl
+    print("{} -> {}".format(sys.argv[1], convert_pickles(sys.argv[1], sys.argv[2])))
@@ -2,14 +2,31 @@ import io
 import os
 import json 
 import gc
+import asyncio
+import secrets
 import pandas as pd
 import numpy as np
-from datetime import date, timedelta
-from fastapi import FastAPI, File, HTTPException
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional
+from fastapi import FastAPI, File, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, conint, conlist
 import lightgbm as lgb
 from lightgbm import LGBMClassifier
 import matplotlib.pyplot as plt
 import joblib
+from registry import ModelRegistry
+from client_index import ClientIndex
+from scores import ScoreTable
+from stats_cache import StatisticsCache, STATISTICS, HISTOGRAM_METHODS
+from dataset_store import ColumnarDataset
+from executor import InferenceExecutor, ExecutorSaturated, predict_proba_task, records_json_task, shap_values_task
+from batcher import MicroBatcher
+from explanations import ShapStore, store_paths, top_contributions
+from explainer_service import ExplainerService
+from response_cache import ResponseCache, ResponseCacheMiddleware
+from years import calculate_years
 
 
 app = FastAPI(
@@ -19,24 +36,21 @@ app = FastAPI(
 )
 
 
-def calculate_years(days):
+def check_admin_token(token):
     """
-    Method used to calculate years based on date (today - quantity of days).
+    Method used to protect the admin EndPoints, they are disabled (404)
+    while ADMIN_TOKEN is not defined.
 
     Parameters:
     -----------------
-        days (int): Numbers of day to rest of today
-
-    Returns:
-    -----------------
-        years (int): Numbers of years
+        token (str): Value of the X-Admin-Token header
     """
 
-    today = date.today()
-    initial_date = today - timedelta(abs(days))
-    years = today.year - initial_date.year - ((today.month, today.day) < (initial_date.month, initial_date.day))
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
 
-    return years
+    if token is None or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="invalid admin token")
 
 
 ########################################################
@@ -51,30 +65,525 @@ COLUMNS = [
 
 
 ########################################################
-# Reading the csv
+# Model settings
+########################################################
+MODEL_VERSION = os.environ.get("MODEL_VERSION", "20220220")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+THRESHOLD = 0.135
+
+# Scoring all the clients to predict when a model is loaded
+PRECOMPUTE_SCORES = os.environ.get("PRECOMPUTE_SCORES", "false").lower() in ("1", "true", "yes")
+SCORE_CHUNK_SIZE = int(os.environ.get("SCORE_CHUNK_SIZE", 10000))
+
+# Predicting with the LightGBM trees compiled to NumPy arrays (see tree_engine.py)
+COMPILED_MODEL = os.environ.get("COMPILED_MODEL", "false").lower() in ("1", "true", "yes")
+
+registry = ModelRegistry("models", compiled=COMPILED_MODEL)
+
+
+########################################################
+# Inference executor, the CPU-bound work runs out of the event loop
+########################################################
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 4))
+INFERENCE_QUEUE_DEPTH = int(os.environ.get("INFERENCE_QUEUE_DEPTH", 32))
+
+executor = InferenceExecutor(INFERENCE_EXECUTOR, INFERENCE_WORKERS, INFERENCE_QUEUE_DEPTH)
+
+# Grouping the concurrent predictions of single clients in one predict_proba call
+MICRO_BATCH = os.environ.get("MICRO_BATCH", "false").lower() in ("1", "true", "yes")
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", 64))
+MICRO_BATCH_LATENCY_MS = float(os.environ.get("MICRO_BATCH_LATENCY_MS", 5))
+
+
+def inference_model(active):
+    """
+    Method used to get the model to send to the executor, a process pool
+    receives the path and loads the model (or its compiled trees) once by worker.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version to use
+
+    Returns:
+    -----------------
+        model (object or str): Model, or path of its pickle (or compiled trees)
+    """
+
+    if executor.kind == "process":
+        return registry.predictor_path(active.version)
+
+    return active.predictor
+
+
+async def run_inference(response, fn, *args):
+    """
+    Method used to run a task in the executor, the timings are reported in
+    the Server-Timing header.
+
+    Parameters:
+    -----------------
+        response (Response): Response of the EndPoint
+        fn (function): Task to run
+        *args: Arguments of the task
+
+    Returns:
+    -----------------
+        result (object): Result of the task, HTTPException 429 if the executor is saturated
+    """
+
+    return await report_timing(response, executor.run(fn, *args))
+
+
+async def report_timing(response, task):
+    """
+    Method used to wait for a task of the executor and report its timings
+    in the Server-Timing header.
+
+    Parameters:
+    -----------------
+        response (Response): Response of the EndPoint
+        task (coroutine): Returns the result and its Timing
+
+    Returns:
+    -----------------
+        result (object): Result of the task, HTTPException 429 if the executor is saturated
+    """
+
+    try:
+        result, timing = await task
+    except ExecutorSaturated:
+        raise HTTPException(status_code=429, detail="too many requests", headers={"Retry-After": "1"})
+
+    response.headers["Server-Timing"] = server_timing(timing)
+
+    return result
+
+
+def server_timing(timing):
+    """
+    Method used to format the timings of a task for the Server-Timing header.
+
+    Parameters:
+    -----------------
+        timing (Timing): Seconds waiting for a worker and computing
+
+    Returns:
+    -----------------
+        header (str): Value of the Server-Timing header
+    """
+
+    return "queue;dur={:.2f}, compute;dur={:.2f}".format(1000 * timing.queue_wait, 1000 * timing.compute)
+
+
+########################################################
+# Reading the datasets (columnar copies of the CSVs)
+########################################################
+CLIENTS_TO_PREDICT_DATASET = "datasets/df_clients_to_predict_20220221.csv"
+CURRENT_CLIENTS_DATASET = "datasets/df_current_clients_20220221.csv"
+
+# Columns used by the statistics, the other ones are only read on demand
+CURRENT_CLIENTS_COLUMNS = [
+    "SK_ID_CURR", "TARGET", "DAYS_BIRTH", "DAYS_EMPLOYED",
+    "AMT_CREDIT", "AMT_INCOME_TOTAL", "EXT_SOURCE_2", "EXT_SOURCE_3",
+]
+
+
+def load_current_clients(dataset, today=None):
+    """
+    Method used to read the current clients and add the columns used by the statistics.
+
+    Parameters:
+    -----------------
+        dataset (ColumnarDataset): Current clients memory-mapped
+        today (datetime.date): Day used to calculate AGE and YEARS_EMPLOYED
+
+    Returns:
+    -----------------
+        df (pandas.DataFrame): Current clients, only the statistics columns
+    """
+
+    df = dataset.to_pandas(CURRENT_CLIENTS_COLUMNS)
+
+    df["AGE"] = calculate_years(df["DAYS_BIRTH"].to_numpy(), today)
+    df["YEARS_EMPLOYED"] = calculate_years(df["DAYS_EMPLOYED"].to_numpy(), today)
+    df["EXT_SOURCE_2"] = df["EXT_SOURCE_2"].round(3)
+    df["EXT_SOURCE_3"] = df["EXT_SOURCE_3"].round(3)
+
+    return df
+
+
+# Displayed values are kept as float64, the other float features as float32
+clients_to_predict_dataset = ColumnarDataset.from_csv(CLIENTS_TO_PREDICT_DATASET, keep_float64=COLUMNS)
+current_clients_dataset = ColumnarDataset.from_csv(CURRENT_CLIENTS_DATASET, keep_float64=CURRENT_CLIENTS_COLUMNS)
+
+df_clients_to_predict = clients_to_predict_dataset.to_pandas()
+df_current_clients = load_current_clients(current_clients_dataset)
+
+
+########################################################
+# Statistics computed once by dataset
+########################################################
+statistics_cache = StatisticsCache()
+
+
+def reload_current_clients():
+    """
+    Method used to reload the current clients, the statistics are only
+    recomputed here.
+    """
+
+    global current_clients_dataset, df_current_clients
+
+    current_clients_dataset = ColumnarDataset.from_csv(CURRENT_CLIENTS_DATASET, keep_float64=CURRENT_CLIENTS_COLUMNS)
+    df_current_clients = load_current_clients(current_clients_dataset)
+    statistics_cache.build(df_current_clients, CURRENT_CLIENTS_DATASET, current_clients_dataset)
+
+
+async def refresh_current_clients_daily():
+    """
+    Method used to recompute AGE, YEARS_EMPLOYED and the statistics once a
+    day, just after midnight, instead of once by process.
+    """
+
+    while True:
+        tomorrow = datetime.combine(date.today() + timedelta(1), time())
+        await asyncio.sleep((tomorrow - datetime.now()).total_seconds() + 1)
+        await run_in_threadpool(reload_current_clients)
+
+
+def statistics_response(name):
+    """
+    Method used to send a distribution already serialized.
+
+    Parameters:
+    -----------------
+        name (str): Statistic's name, e.g. "ages"
+
+    Returns:
+    -----------------
+        response (Response): JSON response
+    """
+
+    return Response(content=statistics_cache.payload(name), media_type="application/json")
+
+
+########################################################
+# Client's id index, shared by all the EndPoints
+########################################################
+clients_index = ClientIndex(df_clients_to_predict["SK_ID_CURR"])
+
+
+def client_position(id):
+    """
+    Method used to get the row position of a client in df_clients_to_predict.
+
+    Parameters:
+    -----------------
+        id (int): Client's id
+
+    Returns:
+    -----------------
+        position (int): Row position, HTTPException 404 if the id is unknown
+    """
+
+    position = clients_index.position(id)
+
+    if position is None:
+        raise HTTPException(status_code=404, detail="client's id not found")
+
+    return position
+
+
+# Client's details, extracted once as a NumPy record array
+clients_details = df_clients_to_predict[COLUMNS].to_records(index=False)
+
+
+def client_details_dict(record, idx, today=None):
+    """
+    Method used to format the details of a client, it only depends on its
+    arguments so concurrent requests can't share values.
+
+    Parameters:
+    -----------------
+        record (numpy.record): Client's values of COLUMNS
+        idx (int): Client's position in the SHAP values
+        today (datetime.date): Day used to calculate the years
+
+    Returns:
+    -----------------
+        client (dict): Client's details
+    """
+
+    # None for a missing number of days
+    age, antiquity, years_employed = [
+        None if np.isnan(years) else int(years) for years in calculate_years(
+            [record["DAYS_BIRTH"], record["DAYS_REGISTRATION"], record["DAYS_EMPLOYED"]], today
+        ).tolist()
+    ]
+
+    return {
+        "clientId" : int(record["SK_ID_CURR"]),
+        "gender" : "Man" if int(record["CODE_GENDER"]) == 0 else "Woman",
+        "age" : age,
+        "antiquity" : antiquity,
+        "yearsEmployed" : years_employed,
+        "goodsPrice" : float(record["AMT_GOODS_PRICE"]),
+        "credit" : float(record["AMT_CREDIT"]),
+        "anualIncome" : float(record["AMT_INCOME_TOTAL"]),
+        "source2" : float(record["EXT_SOURCE_2"]),
+        "source3" : float(record["EXT_SOURCE_3"]),
+        "shapPosition" : idx
+    }
+
+
+# Features used by the model, in the training order
+FEATURES = df_clients_to_predict.columns[2:].tolist()
+
+
+########################################################
+# Cache of the responses of the read-only EndPoints
+########################################################
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1024))
+RESPONSE_CACHE_CONTROL = os.environ.get("RESPONSE_CACHE_CONTROL", "no-cache")
+
+# The clients' list, details and statistics only depend on these data
+CACHED_PATHS = [
+    r"^/api/clients$",
+    r"^/api/clients/\d+$",
+    r"^/api/statistics/",
+]
+
+
+def data_version():
+    """
+    Method used to get the version of the data the cached responses depend
+    on, the years (ages...) also change with the day.
+
+    Returns:
+    -----------------
+        version (tuple): Datasets, statistics' build, model's version and day
+    """
+
+    return (
+        CLIENTS_TO_PREDICT_DATASET, statistics_cache.version, statistics_cache.generation,
+        registry.active.version, date.today().isoformat()
+    )
+
+
+response_cache = ResponseCache(CACHED_PATHS, data_version, RESPONSE_CACHE_CONTROL, RESPONSE_CACHE_SIZE)
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
+
+########################################################
+# Precomputed scores
+########################################################
+score_table = None
+
+
+def precompute_scores(active):
+    """
+    Method used to score all the clients to predict with the model loaded.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version loaded
+    """
+
+    global score_table
+
+    score_table = ScoreTable.compute(active, df_clients_to_predict.iloc[:, 2:], THRESHOLD, SCORE_CHUNK_SIZE)
+
+
+if PRECOMPUTE_SCORES:
+    registry.on_load(precompute_scores)
+
+
+########################################################
+# Precomputed SHAP values of the clients to predict
+########################################################
+SHAP_VALUES = os.environ.get("SHAP_VALUES", "shap_models/shap_values_20220220.pkl")
+SHAP_EXPLAINER = os.environ.get("SHAP_EXPLAINER", "shap_models/explainer_20220220.pkl")
+
+shap_store = None
+
+
+def load_shap_values():
+    """
+    Method used to open the SHAP values of the class 1 (memory-mapped), they
+    are converted from the pickles the first time.
+
+    Returns:
+    -----------------
+        store (ShapStore): SHAP values by client, None if they are not available
+    """
+
+    values_path, metadata_path = store_paths(SHAP_VALUES)
+
+    if not os.path.isfile(SHAP_VALUES) and not (os.path.isfile(values_path) and os.path.isfile(metadata_path)):
+        return None
+
+    store = ShapStore.from_pickles(SHAP_VALUES, SHAP_EXPLAINER, FEATURES)
+
+    if len(store) != len(df_clients_to_predict):
+        raise ValueError("{} SHAP values for {} clients to predict".format(len(store), len(df_clients_to_predict)))
+
+    return store
+
+
+def explanation_dict(expected_value, indices, values, others, row):
+    """
+    Method used to serialize the top contributions of an explanation, only
+    these features' names, values and SHAP values are sent.
+
+    Parameters:
+    -----------------
+        expected_value (float): Base value of the explanation
+        indices (numpy.ndarray): Features' indices, sorted by absolute value
+        values (numpy.ndarray): SHAP values of these features
+        others (float): Sum of the SHAP values of the rest of the features
+        row (numpy.ndarray): Client's features in the training order
+
+    Returns:
+    -----------------
+        explanation (dict): Base value, contributions and output value
+    """
+
+    features_values = row[indices].astype(np.float64)
+
+    return {
+        "baseValue" : expected_value,
+        "contributions" : [
+            {"feature" : FEATURES[i], "value" : None if np.isnan(value) else value, "shapValue" : shap_value}
+            for i, value, shap_value in zip(indices.tolist(), features_values.tolist(), values.tolist())
+        ],
+        "othersContribution" : others,
+        "outputValue" : expected_value + float(values.sum()) + others
+    }
+
+
+# Explaining on demand the feature rows not in the precomputed SHAP values
+EXPLANATIONS_CACHE_SIZE = int(os.environ.get("EXPLANATIONS_CACHE_SIZE", 4096))
+# Rows by request, the rows missing from the cache are computed by batches
+EXPLANATIONS_MAX_ROWS = int(os.environ.get("EXPLANATIONS_MAX_ROWS", 100))
+# Rows of concurrent requests computed together, a batch is a task of the executor.
+# Slower by row than a prediction, the batches are smaller than the predictions' ones
+EXPLANATIONS_BATCH_MAX_SIZE = int(os.environ.get("EXPLANATIONS_BATCH_MAX_SIZE", 16))
+EXPLANATIONS_BATCH_LATENCY_MS = float(os.environ.get("EXPLANATIONS_BATCH_LATENCY_MS", 10))
+
+
+async def compute_shap_values(active, X, approximate):
+    """
+    Method used to compute the SHAP values of feature rows in the executor,
+    a process pool receives the path of the model's pickle.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version to use
+        X (numpy.ndarray): Features in the training order
+        approximate (bool): Saabas contributions instead of the exact values
+
+    Returns:
+    -----------------
+        (values, expected_value, seconds): SHAP values, base value and compute time
+    """
+
+    model = registry.model_path(active.version) if executor.kind == "process" else active.model
+
+    (values, expected_value), timing = await executor.run(shap_values_task, model, X, approximate)
+
+    return values, expected_value, timing.compute
+
+
+explainer_service = ExplainerService(
+    compute_shap_values, EXPLANATIONS_CACHE_SIZE, EXPLANATIONS_BATCH_MAX_SIZE, EXPLANATIONS_BATCH_LATENCY_MS / 1000
+)
+
+
+########################################################
+# Micro-batching of the predictions by client
 ########################################################
-df_clients_to_predict = pd.read_csv("datasets/df_clients_to_predict_20220221.csv")
-df_current_clients = pd.read_csv("datasets/df_current_clients_20220221.csv")
+async def predict_positions(active, positions):
+    """
+    Method used to predict a batch of clients to predict with one call.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version to use
+        positions (list): Clients' row positions
+
+    Returns:
+    -----------------
+        results (list): (result_proba of one row, Timing) by position
+    """
+
+    X = df_clients_to_predict.iloc[positions, 2:]
+    result_proba, timing = await executor.run(predict_proba_task, inference_model(active), X)
+
+    return [(result_proba[i:i + 1], timing) for i in range(len(positions))]
+
 
-df_current_clients["AGE"] = df_current_clients["DAYS_BIRTH"].apply(lambda x: calculate_years(x))
-df_current_clients["YEARS_EMPLOYED"] = df_current_clients["DAYS_EMPLOYED"].apply(lambda x: calculate_years(x))
-df_current_clients["EXT_SOURCE_2"] = df_current_clients["EXT_SOURCE_2"].round(3)
-df_current_clients["EXT_SOURCE_3"] = df_current_clients["EXT_SOURCE_3"].round(3)
+batcher = MicroBatcher(predict_positions, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_LATENCY_MS / 1000) if MICRO_BATCH else None
 
-df_current_clients_by_target_repaid = df_current_clients[df_current_clients["TARGET"] == 0]
-df_current_clients_by_target_not_repaid = df_current_clients[df_current_clients["TARGET"] == 1]
 
+@app.on_event("startup")
+async def load_model():
+    """
+    Loading the model once, it is kept in memory for all the requests
+    """
+
+    registry.load(MODEL_VERSION)
+
+
+@app.on_event("startup")
+async def load_explanations():
+    """
+    Opening the SHAP values once, only the rows requested are read
+    """
+
+    global shap_store
+
+    shap_store = load_shap_values()
+
+
+@app.on_event("startup")
+async def load_statistics():
+    """
+    Computing all the statistics once, they are kept serialized in memory
+    """
+
+    statistics_cache.build(df_current_clients, CURRENT_CLIENTS_DATASET, current_clients_dataset)
+    asyncio.create_task(refresh_current_clients_daily())
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    """
+    Stopping the workers of the executor
+    """
+
+    executor.shutdown()
 
 
 @app.get("/api/clients")
-async def clients_id():
+async def clients_id(
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[int] = Query(None),
+    prefix: Optional[str] = Query(None, regex=r"^\d{0,18}$")
+):
     """ 
-    EndPoint to get all clients id
+    EndPoint to get all clients id, or a page of ids in ascending order
+    (limit, cursor from the previous page, prefix of the ids searched)
     """
-    
-    clients_id = df_clients_to_predict["SK_ID_CURR"].tolist()
 
-    return {"clientsId": clients_id}
+    if limit is None and cursor is None and prefix is None:
+        clients_id = clients_index.ids.tolist()
+
+        return {"clientsId": clients_id}
+
+    clients_id, next_cursor = clients_index.page(prefix or "", cursor, limit or 100)
+
+    return {"clientsId": clients_id, "nextCursor": next_cursor}
 
 
 @app.get("/api/clients/{id}")
@@ -83,156 +592,500 @@ async def client_details(id: int):
     EndPoint to get client's detail 
     """ 
 
-    clients_id = df_clients_to_predict["SK_ID_CURR"].tolist()
+    position = client_position(id)
 
-    if id not in clients_id:
-        raise HTTPException(status_code=404, detail="client's id not found")
+    return client_details_dict(clients_details[position], int(df_clients_to_predict.index[position]))
+
+
+async def client_prediction_dict(active, position, response):
+    """
+    Method used to get the prediction of a client, precomputed when possible.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version to use
+        position (int): Client's position in the clients to predict
+        response (Response): Response of the EndPoint, for the timings
+
+    Returns:
+    -----------------
+        prediction (dict): Decision, probabilities, threshold and model's version
+    """
+
+    threshold = THRESHOLD
+
+    # Looking for the precomputed score of the same model's version
+    score = score_table.lookup(position, active.version) if score_table is not None else None
+
+    if score is not None:
+        probability0 = float(score["probability0"])
+        probability1 = float(score["probability1"])
+        result = int(score["decision"])
     else:
-        # Filtering by client's id
-        df_by_id = df_clients_to_predict[COLUMNS][df_clients_to_predict["SK_ID_CURR"] == id]
-        idx = df_clients_to_predict[df_clients_to_predict["SK_ID_CURR"]==id].index[0]
-
-        for col in df_by_id.columns:
-            globals()[col] = df_by_id.iloc[0, df_by_id.columns.get_loc(col)]
-        
-        client = {
-            "clientId" : int(SK_ID_CURR),
-            "gender" : "Man" if int(CODE_GENDER) == 0 else "Woman",
-            "age" : calculate_years(int(DAYS_BIRTH)),
-            "antiquity" : calculate_years(int(DAYS_REGISTRATION)),
-            "yearsEmployed" : calculate_years(int(DAYS_EMPLOYED)),
-            "goodsPrice" : float(AMT_GOODS_PRICE),
-            "credit" : float(AMT_CREDIT),
-            "anualIncome" : float(AMT_INCOME_TOTAL),
-            "source2" : float(EXT_SOURCE_2),
-            "source3" : float(EXT_SOURCE_3),
-            "shapPosition" : int(idx)
-        }
+        if batcher is not None:
+            # Predicting with the concurrent requests of the same model
+            result_proba = await report_timing(response, batcher.submit(active, position))
+        else:
+            # Filtering by client's position, without the 2 first columns
+            df_prediction_by_id = df_clients_to_predict.iloc[[position], 2:]
 
-    return client
+            # Predicting in the executor
+            result_proba = await run_inference(response, predict_proba_task, inference_model(active), df_prediction_by_id)
+
+        y_prob = result_proba[:, 1]
+
+        probability0 = float(result_proba[0][0])
+        probability1 = float(result_proba[0][1])
+        result = int((y_prob >= threshold).astype(int)[0])
+
+    if (result == 0):
+        result = "Yes"
+    else:
+        result = "No"    
+
+    return {
+        "repay" : result,
+        "probability0" : probability0,
+        "probability1" : probability1,
+        "threshold" : threshold,
+        "modelVersion" : active.version
+    }
 
 
 @app.get("/api/predictions/clients/{id}")
-async def predict(id: int):
+async def predict(id: int, response: Response):
     """ 
     EndPoint to get the probability honor/compliance of a client
     """ 
 
-    clients_id = df_clients_to_predict["SK_ID_CURR"].tolist()
+    position = client_position(id)
 
-    if id not in clients_id:
-        raise HTTPException(status_code=404, detail="client's id not found")
+    # Getting the model loaded at startup
+    active = registry.active
+
+    return await client_prediction_dict(active, position, response)
+
+
+def check_features(rows):
+    """
+    Method used to check that raw feature rows only use the model's features.
+
+    Parameters:
+    -----------------
+        rows (list): Dicts of feature -> value, HTTPException 422 for unknown features
+    """
+
+    unknown_features = {feature for row in rows for feature in row} - set(FEATURES)
+
+    if unknown_features:
+        raise HTTPException(status_code=422, detail="unknown features: {}".format(", ".join(sorted(unknown_features))))
+
+
+# Rows by batch, the body is parsed and validated on the event loop before
+# the first line is sent: a feature row weighs hundreds of floats, an id one int
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", 100000))
+BATCH_MAX_FEATURE_ROWS = int(os.environ.get("BATCH_MAX_FEATURE_ROWS", 1000))
+
+
+class BatchPredictionRequest(BaseModel):
+    """
+    Body of the batch prediction, either clients' ids or raw feature rows
+    """
+
+    clientsId: Optional[conlist(int, max_items=BATCH_MAX_ROWS)] = None
+    features: Optional[conlist(Dict[str, Optional[float]], max_items=BATCH_MAX_FEATURE_ROWS)] = None
+
+
+async def batch_prediction_lines(active, keys, X, threshold):
+    """
+    Method used to predict a chunk of a batch in the executor and serialize
+    it as NDJSON, one vectorized predict_proba call.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version to use
+        keys (list): Dict identifying each row in the response
+        X (pandas.DataFrame): Features in the training order
+        threshold (float): Threshold to decide whether the client will not repay
+
+    Returns:
+    -----------------
+        (lines, timing): NDJSON string of the chunk and Timing of its task,
+                         ExecutorSaturated if the executor is saturated
+    """
+
+    result_proba, timing = await executor.run(predict_proba_task, inference_model(active), X)
+
+    lines = []
+
+    for key, (probability0, probability1) in zip(keys, result_proba):
+        lines.append(json.dumps({
+            **key,
+            "repay" : "Yes" if probability1 < threshold else "No",
+            "probability0" : float(probability0),
+            "probability1" : float(probability1),
+            "threshold" : threshold,
+            "modelVersion" : active.version
+        }) + "\n")
+
+    return "".join(lines), timing
+
+
+async def batch_prediction_by_ids(active, clients_id, threshold):
+    """
+    Method used to predict a batch of clients to predict by their ids,
+    the rows are extracted chunk by chunk to keep the memory bounded.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version to use
+        clients_id (list): Clients' ids
+        threshold (float): Threshold to decide whether the client will not repay
+
+    Returns:
+    -----------------
+        Async generator of (NDJSON string, Timing or None) by chunk
+    """
+
+    for start in range(0, len(clients_id), SCORE_CHUNK_SIZE):
+        keys, positions, not_found = [], [], []
+
+        for id in clients_id[start:start + SCORE_CHUNK_SIZE]:
+            position = clients_index.position(id)
+            if position is None:
+                not_found.append(json.dumps({"clientId" : id, "error" : "client's id not found"}) + "\n")
+            else:
+                keys.append({"clientId" : id})
+                positions.append(position)
+
+        lines, timing = "", None
+        if positions:
+            lines, timing = await batch_prediction_lines(active, keys, df_clients_to_predict.iloc[positions, 2:], threshold)
+
+        yield "".join(not_found) + lines, timing
+
+
+async def batch_prediction_by_features(active, rows, threshold):
+    """
+    Method used to predict a batch of raw feature rows, the DataFrame is
+    built chunk by chunk to keep the memory bounded.
+
+    Parameters:
+    -----------------
+        active (ActiveModel): Model and version to use
+        rows (list): Dicts of feature -> value, missing features are NaN
+        threshold (float): Threshold to decide whether the client will not repay
+
+    Returns:
+    -----------------
+        Async generator of (NDJSON string, Timing) by chunk
+    """
+
+    for start in range(0, len(rows), SCORE_CHUNK_SIZE):
+        chunk = rows[start:start + SCORE_CHUNK_SIZE]
+        keys = [{"row" : start + i} for i in range(len(chunk))]
+        X = pd.DataFrame.from_records(chunk, columns=FEATURES).astype(np.float64)
+
+        yield await batch_prediction_lines(active, keys, X, threshold)
+
+
+async def batch_stream(first, chunks):
+    """
+    Method used to stream a batch whose first chunk is already predicted.
+    Once the response has started, a saturated executor can't give a 429
+    anymore: an error line ends the stream.
+
+    Parameters:
+    -----------------
+        first (str): NDJSON lines of the first chunk
+        chunks (async generator): Next chunks, (NDJSON string, Timing)
+
+    Returns:
+    -----------------
+        Async generator of NDJSON strings
+    """
+
+    yield first
+
+    try:
+        async for lines, _ in chunks:
+            yield lines
+    except ExecutorSaturated:
+        yield json.dumps({"error" : "too many requests, the batch is incomplete"}) + "\n"
+
+
+@app.post("/api/predictions/batch")
+async def predict_batch(batch: BatchPredictionRequest):
+    """ 
+    EndPoint to get the predictions of many clients, streamed as NDJSON
+    """
+
+    if (batch.clientsId is None) == (batch.features is None):
+        raise HTTPException(status_code=422, detail="either clientsId or features is required")
+
+    # Same model's version for the whole batch
+    active = registry.active
+
+    if batch.clientsId is not None:
+        chunks = batch_prediction_by_ids(active, batch.clientsId, THRESHOLD)
     else:
-        # Loading the model
-        model = joblib.load("models/model_20220220.pkl")
+        check_features(batch.features)
 
-        threshold = 0.135
+        chunks = batch_prediction_by_features(active, batch.features, THRESHOLD)
 
-        # Filtering by client's id
-        df_prediction_by_id = df_clients_to_predict[df_clients_to_predict["SK_ID_CURR"] == id]
-        df_prediction_by_id = df_prediction_by_id.drop(df_prediction_by_id.columns[[0, 1]], axis=1)
+    # The first chunk is predicted before the response starts, so a
+    # saturated executor still gives a 429 and its timings are reported
+    try:
+        first, timing = await chunks.__anext__()
+    except StopAsyncIteration:
+        first, timing = "", None
+    except ExecutorSaturated:
+        raise HTTPException(status_code=429, detail="too many requests", headers={"Retry-After": "1"})
 
-        # Predicting
-        result_proba = model.predict_proba(df_prediction_by_id)
-        y_prob = result_proba[:, 1]
+    headers = {"Server-Timing" : server_timing(timing)} if timing is not None else None
 
-        result = (y_prob >= threshold).astype(int)
+    return StreamingResponse(batch_stream(first, chunks), media_type="application/x-ndjson", headers=headers)
 
-        if (int(result[0]) == 0):
-            result = "Yes"
-        else:
-            result = "No"    
 
-    return {
-        "repay" : result,
-        "probability0" : result_proba[0][0],
-        "probability1" : result_proba[0][1],
-        "threshold" : threshold
-    }
+@app.get("/api/admin/models")
+async def models(x_admin_token: str = Header(None)):
+    """ 
+    EndPoint to get the active model's version and the versions available
+    """
 
+    check_admin_token(x_admin_token)
 
-@app.get("/api/predictions/clients/shap/{id}")
-async def client_shap_df(id: int):
+    return {"modelVersion": registry.active.version, "versions": registry.versions()}
+
+
+@app.get("/api/admin/executor")
+async def executor_stats(x_admin_token: str = Header(None)):
     """ 
-    EndPoint to return a df with all client's data
+    EndPoint to get the state of the inference executor (queue, timings)
+    """
+
+    check_admin_token(x_admin_token)
+
+    return executor.stats()
+
+
+@app.get("/api/admin/responseCache")
+async def response_cache_stats(x_admin_token: str = Header(None)):
     """ 
-    
-    clients_id = df_clients_to_predict["SK_ID_CURR"].tolist()
+    EndPoint to get the state of the responses' cache
+    """
 
-    if id not in clients_id:
-        raise HTTPException(status_code=404, detail="client's id not found")
-    else:
+    check_admin_token(x_admin_token)
 
-        # Filtering by client's id
-        idx = df_clients_to_predict[df_clients_to_predict["SK_ID_CURR"]==id].index[0]
+    return response_cache.stats()
 
-        client = df_clients_to_predict[df_clients_to_predict["SK_ID_CURR"] == id].drop(columns=["SK_ID_CURR", "AMT_INCOME_TOTAL"])
-        client = client.to_json(orient="records")
+
+@app.put("/api/admin/models/{version}")
+async def swap_model(version: str, x_admin_token: str = Header(None)):
+    """ 
+    EndPoint to load a new model's version without restarting the server
+    """
+
+    check_admin_token(x_admin_token)
+
+    if version not in registry.versions():
+        raise HTTPException(status_code=404, detail="model's version not found")
+
+    previous = await run_in_threadpool(registry.load, version)
+
+    return {"modelVersion": registry.active.version, "previousVersion": previous.version}
+
+
+@app.get("/api/predictions/clients/shap/{id}", deprecated=True)
+async def client_shap_df(id: int, response: Response):
+    """ 
+    EndPoint to return a df with all client's data, replaced by /api/explanations/clients/{id}
+    """ 
+    
+    position = client_position(id)
+
+    # Filtering by client's position
+    client = df_clients_to_predict.iloc[[position]].drop(columns=["SK_ID_CURR", "AMT_INCOME_TOTAL"])
+    client = await run_inference(response, records_json_task, client)
 
     return client
 
 
-@app.get("/api/statistics/ages")
-async def statistical_age():
+def client_explanation_dict(position, top):
+    """
+    Method used to get the top contributions of a client from the precomputed SHAP values.
+
+    Parameters:
+    -----------------
+        position (int): Client's position in the clients to predict
+        top (int): Number of features
+
+    Returns:
+    -----------------
+        explanation (dict): Base value, contributions and output value
+    """
+
+    indices, values, others = shap_store.top_contributions(position, top)
+    row = df_clients_to_predict.iloc[position, 2:].to_numpy(dtype=np.float64)
+
+    return explanation_dict(shap_store.expected_value, indices, values, others, row)
+
+
+@app.get("/api/explanations/clients/{id}")
+async def client_explanation(id: int, top: int = Query(10, ge=1, le=1000)):
     """ 
-    EndPoint to get some statistics - ages
+    EndPoint to get the features contributing the most to the client's prediction (SHAP values)
     """
 
-    ages_data_repaid = df_current_clients_by_target_repaid.groupby("AGE").size()
-    ages_data_repaid = pd.DataFrame(ages_data_repaid).reset_index()
-    ages_data_repaid.columns = ["AGE", "AMOUNT"]
-    ages_data_repaid = ages_data_repaid.set_index("AGE").to_dict()["AMOUNT"]
+    if shap_store is None:
+        raise HTTPException(status_code=503, detail="explanations not available")
 
-    ages_data_not_repaid = df_current_clients_by_target_not_repaid.groupby("AGE").size()
-    ages_data_not_repaid = pd.DataFrame(ages_data_not_repaid).reset_index()
-    ages_data_not_repaid.columns = ["AGE", "AMOUNT"]
-    ages_data_not_repaid = ages_data_not_repaid.set_index("AGE").to_dict()["AMOUNT"]
+    position = client_position(id)
 
-    return {"ages_repaid" : ages_data_repaid, "ages_not_repaid" : ages_data_not_repaid}
+    return {"clientId" : id, **client_explanation_dict(position, top)}
 
 
-@app.get("/api/statistics/yearsEmployed")
-async def statistical_years_employed():
+# Sections of the dossier, and the client's detail compared with each statistic
+DOSSIER_FIELDS = ["details", "prediction", "explanation", "percentiles"]
+PERCENTILES = {
+    "ages" : "age",
+    "yearsEmployed" : "yearsEmployed",
+    "amtCredits" : "credit",
+    "amtIncomes" : "anualIncome",
+    "extSource2" : "source2",
+    "extSource3" : "source3"
+}
+
+
+@app.get("/api/clients/{id}/dossier")
+async def client_dossier(id: int, response: Response, fields: Optional[str] = Query(None), top: int = Query(10, ge=1, le=1000)):
     """ 
-    EndPoint to get some statistics - years employed
+    EndPoint to get in one request the client's details, prediction, explanation
+    and percentiles in the statistics, fields (comma-separated) selects the sections
     """
 
-    years_employed_data_repaid = df_current_clients_by_target_repaid.groupby("YEARS_EMPLOYED").size()
-    years_employed_data_repaid = pd.DataFrame(years_employed_data_repaid).reset_index()
-    years_employed_data_repaid.columns = ["YEARS_EMPLOYED", "AMOUNT"]
-    years_employed_data_repaid = years_employed_data_repaid.set_index("YEARS_EMPLOYED").to_dict()["AMOUNT"]
+    fields = DOSSIER_FIELDS if fields is None else [field.strip() for field in fields.split(",") if field.strip()]
+
+    unknown_fields = set(fields) - set(DOSSIER_FIELDS)
+    if unknown_fields:
+        raise HTTPException(status_code=422, detail="unknown fields: {}".format(", ".join(sorted(unknown_fields))))
+
+    position = client_position(id)
+
+    dossier = {"clientId" : id}
+
+    details = client_details_dict(clients_details[position], int(df_clients_to_predict.index[position]))
+
+    if "details" in fields:
+        dossier["details"] = details
+
+    if "prediction" in fields:
+        dossier["prediction"] = await client_prediction_dict(registry.active, position, response)
 
-    years_employed_data_not_repaid = df_current_clients_by_target_not_repaid.groupby("YEARS_EMPLOYED").size()
-    years_employed_data_not_repaid = pd.DataFrame(years_employed_data_not_repaid).reset_index()
-    years_employed_data_not_repaid.columns = ["YEARS_EMPLOYED", "AMOUNT"]
-    years_employed_data_not_repaid = years_employed_data_not_repaid.set_index("YEARS_EMPLOYED").to_dict()["AMOUNT"]
+    if "explanation" in fields:
+        dossier["explanation"] = client_explanation_dict(position, top) if shap_store is not None else None
+
+    if "percentiles" in fields:
+        dossier["percentiles"] = {
+            name : statistics_cache.percentile(name, details[key]) for name, key in PERCENTILES.items()
+        }
+
+    return dossier
+
+
+class ExplanationRequest(BaseModel):
+    """
+    Body of the explanations of raw feature rows
+    """
+
+    features: conlist(Dict[str, Optional[float]], max_items=EXPLANATIONS_MAX_ROWS)
+    top: conint(ge=1, le=1000) = 10
+    approximate: bool = False
+    budgetMs: Optional[float] = None
+
+
+@app.post("/api/explanations")
+async def explain_features(request: ExplanationRequest):
+    """ 
+    EndPoint to get the SHAP values of raw feature rows, e.g. new applicants
+    """
+
+    check_features(request.features)
+
+    # Same model's version for all the rows
+    active = registry.active
+
+    X = pd.DataFrame.from_records(request.features, columns=FEATURES).to_numpy(dtype=np.float64)
+    budget = request.budgetMs / 1000 if request.budgetMs is not None else None
+
+    try:
+        explanations = await explainer_service.explain(active, X, request.approximate, budget)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=429, detail="too many requests", headers={"Retry-After": "1"})
 
     return {
-        "years_employed_repaid" : years_employed_data_repaid,
-        "years_employed_not_repaid" : years_employed_data_not_repaid
+        "modelVersion" : active.version,
+        "explanations" : [
+            {
+                "row" : i,
+                **explanation_dict(explanation.expected_value, *top_contributions(explanation.values, request.top), X[i]),
+                "approximate" : explanation.approximate,
+                "cached" : explanation.cached
+            }
+            for i, explanation in enumerate(explanations)
+        ]
     }
 
 
+@app.get("/api/admin/explanations")
+async def explanations_stats(x_admin_token: str = Header(None)):
+    """ 
+    EndPoint to get the state of the explanations' cache
+    """
+
+    check_admin_token(x_admin_token)
+
+    return explainer_service.stats()
+
+
+@app.post("/api/admin/datasets/currentClients/reload")
+async def reload_statistics(x_admin_token: str = Header(None)):
+    """ 
+    EndPoint to reload the current clients and recompute the statistics
+    """
+
+    check_admin_token(x_admin_token)
+
+    await run_in_threadpool(reload_current_clients)
+
+    return {"dataset": statistics_cache.version}
+
+
+@app.get("/api/statistics/ages")
+async def statistical_age():
+    """ 
+    EndPoint to get some statistics - ages
+    """
+
+    return statistics_response("ages")
+
+
+@app.get("/api/statistics/yearsEmployed")
+async def statistical_years_employed():
+    """ 
+    EndPoint to get some statistics - years employed
+    """
+
+    return statistics_response("yearsEmployed")
+
+
 @app.get("/api/statistics/amtCredits")
 async def statistical_amt_credit():
     """ 
     EndPoint to get some statistics - AMT Credit
     """
 
-    amt_credit_data_repaid = df_current_clients_by_target_repaid.groupby("AMT_CREDIT").size()
-    amt_credit_data_repaid = pd.DataFrame(amt_credit_data_repaid).reset_index()
-    amt_credit_data_repaid.columns = ["AMT_CREDIT", "AMOUNT"]
-    amt_credit_data_repaid = amt_credit_data_repaid.set_index("AMT_CREDIT").to_dict()["AMOUNT"]
-
-    amt_credit_data_not_repaid = df_current_clients_by_target_not_repaid.groupby("AMT_CREDIT").size()
-    amt_credit_data_not_repaid = pd.DataFrame(amt_credit_data_not_repaid).reset_index()
-    amt_credit_data_not_repaid.columns = ["AMT_CREDIT", "AMOUNT"]
-    amt_credit_data_not_repaid = amt_credit_data_not_repaid.set_index("AMT_CREDIT").to_dict()["AMOUNT"]
-
-    return {
-        "amt_credit_repaid" : amt_credit_data_repaid,
-        "amt_credit_not_repaid" : amt_credit_data_not_repaid
-    }
+    return statistics_response("amtCredits")
 
 
 @app.get("/api/statistics/amtIncomes")
@@ -241,20 +1094,8 @@ async def statistical_amt_income():
     EndPoint to get some statistics - AMT Income
     """
 
-    amt_income_data_repaid = df_current_clients_by_target_repaid.groupby("AMT_INCOME_TOTAL").size()
-    amt_income_data_repaid = pd.DataFrame(amt_income_data_repaid).reset_index()
-    amt_income_data_repaid.columns = ["AMT_INCOME", "AMOUNT"]
-    amt_income_data_repaid = amt_income_data_repaid.set_index("AMT_INCOME").to_dict()["AMOUNT"]
+    return statistics_response("amtIncomes")
 
-    amt_income_data_not_repaid = df_current_clients_by_target_not_repaid.groupby("AMT_INCOME_TOTAL").size()
-    amt_income_data_not_repaid = pd.DataFrame(amt_income_data_not_repaid).reset_index()
-    amt_income_data_not_repaid.columns = ["AMT_INCOME", "AMOUNT"]
-    amt_income_data_not_repaid = amt_income_data_not_repaid.set_index("AMT_INCOME").to_dict()["AMOUNT"]
-
-    return {
-        "amt_income_repaid" : amt_income_data_repaid,
-        "amt_income_not_repaid" : amt_income_data_not_repaid
-    }
 
 @app.get("/api/statistics/extSource2")
 async def statistical_ext_source_2():
@@ -262,20 +1103,7 @@ async def statistical_ext_source_2():
     EndPoint to get some statistics - EXT SOURCE 2
     """
 
-    ext_source_2_data_repaid = df_current_clients_by_target_repaid.groupby("EXT_SOURCE_2").size()
-    ext_source_2_data_repaid = pd.DataFrame(ext_source_2_data_repaid).reset_index()
-    ext_source_2_data_repaid.columns = ["EXT_SOURCE_2", "AMOUNT"]
-    ext_source_2_data_repaid = ext_source_2_data_repaid.set_index("EXT_SOURCE_2").to_dict()["AMOUNT"]
-
-    ext_source_2_data_not_repaid = df_current_clients_by_target_not_repaid.groupby("EXT_SOURCE_2").size()
-    ext_source_2_data_not_repaid = pd.DataFrame(ext_source_2_data_not_repaid).reset_index()
-    ext_source_2_data_not_repaid.columns = ["EXT_SOURCE_2", "AMOUNT"]
-    ext_source_2_data_not_repaid = ext_source_2_data_not_repaid.set_index("EXT_SOURCE_2").to_dict()["AMOUNT"]
-
-    return {
-        "ext_source_2_repaid" : ext_source_2_data_repaid,
-        "ext_source_2_not_repaid" : ext_source_2_data_not_repaid
-    }
+    return statistics_response("extSource2")
 
 
 @app.get("/api/statistics/extSource3")
@@ -284,21 +1112,33 @@ async def statistical_ext_source_3():
     EndPoint to get some statistics - EXT SOURCE 3
     """
 
-    ext_source_3_data_repaid = df_current_clients_by_target_repaid.groupby("EXT_SOURCE_3").size()
-    ext_source_3_data_repaid = pd.DataFrame(ext_source_3_data_repaid).reset_index()
-    ext_source_3_data_repaid.columns = ["EXT_SOURCE_3", "AMOUNT"]
-    ext_source_3_data_repaid = ext_source_3_data_repaid.set_index("EXT_SOURCE_3").to_dict()["AMOUNT"]
+    return statistics_response("extSource3")
 
-    ext_source_3_data_not_repaid = df_current_clients_by_target_not_repaid.groupby("EXT_SOURCE_3").size()
-    ext_source_3_data_not_repaid = pd.DataFrame(ext_source_3_data_not_repaid).reset_index()
-    ext_source_3_data_not_repaid.columns = ["EXT_SOURCE_3", "AMOUNT"]
-    ext_source_3_data_not_repaid = ext_source_3_data_not_repaid.set_index("EXT_SOURCE_3").to_dict()["AMOUNT"]
 
-    return {
-        "ext_source_3_repaid" : ext_source_3_data_repaid,
-        "ext_source_3_not_repaid" : ext_source_3_data_not_repaid
-    }
+@app.get("/api/statistics/{name}/density")
+async def statistical_density(name: str):
+    """ 
+    EndPoint to get the density curves of a statistic (ages, yearsEmployed, ...)
+    """
+
+    if name not in STATISTICS:
+        raise HTTPException(status_code=404, detail="statistic not found")
+
+    return Response(content=statistics_cache.density(name), media_type="application/json")
+
+
+@app.get("/api/statistics/{feature}")
+async def statistical_histogram(feature: str, bins: int = Query(20, ge=1, le=1000), method: str = "uniform"):
+    """ 
+    EndPoint to get the histogram of any numeric feature of the current clients
+    """
+
+    if method not in HISTOGRAM_METHODS:
+        raise HTTPException(status_code=422, detail="method must be one of: {}".format(", ".join(HISTOGRAM_METHODS)))
 
+    if feature not in statistics_cache.columns():
+        raise HTTPException(status_code=404, detail="feature not found")
 
+    payload = await run_in_threadpool(statistics_cache.histogram, feature, bins, method)
 
-    
\ No newline at end of file
+    return Response(content=payload, media_type="application/json")
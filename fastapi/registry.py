@@ -0,0 +1,166 @@
+import os
+import glob
+import threading
+from collections import namedtuple
+import joblib
+from tree_engine import TreeEnsemble, compiled_path
+
+
+########################################################
+# Model registry
+########################################################
+# predictor is the object used for predict_proba, the model itself or its compiled trees
+ActiveModel = namedtuple("ActiveModel", ["version", "model", "predictor"])
+
+
+class ModelRegistry:
+    """
+    Class used to keep the scoring model in memory and swap it atomically.
+
+    The model is loaded once (at startup) and shared by every request. A new
+    versioned pickle can be loaded at any time, the active model is replaced
+    only once the new one is completely loaded, so the requests in progress
+    keep working with the version they started with.
+
+    Parameters:
+    -----------------
+        models_path (str): Folder where the models are saved as model_{version}.pkl
+        compiled (bool): Predicting with the trees compiled to NumPy arrays
+                         (model_{version}.trees.npz) instead of the Pipeline
+    """
+
+    def __init__(self, models_path="models", compiled=False):
+        self.models_path = models_path
+        self.compiled = compiled
+        self._active = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def model_path(self, version):
+        """
+        Method used to get the path of a specific model version.
+
+        Parameters:
+        -----------------
+            version (str): Model's version, e.g. 20220220
+
+        Returns:
+        -----------------
+            path (str): Path of the pickle
+        """
+
+        return os.path.join(self.models_path, "model_{version}.pkl".format(version=version))
+
+    def predictor_path(self, version):
+        """
+        Method used to get the path of the object used to predict, the compiled
+        trees when they are enabled.
+
+        Parameters:
+        -----------------
+            version (str): Model's version, e.g. 20220220
+
+        Returns:
+        -----------------
+            path (str): Path of the pickle or of the compiled trees
+        """
+
+        path = self.model_path(version)
+
+        return compiled_path(path) if self.compiled else path
+
+    def compile(self, path, model):
+        """
+        Method used to get the compiled trees of a model, they are exported
+        next to the pickle the first time (or when the pickle is newer).
+
+        Parameters:
+        -----------------
+            path (str): Path of the model's pickle
+            model (object): Model loaded from the pickle
+
+        Returns:
+        -----------------
+            trees (TreeEnsemble): Compiled model
+        """
+
+        trees_path = compiled_path(path)
+
+        if os.path.isfile(trees_path) and os.path.getmtime(trees_path) >= os.path.getmtime(path):
+            return TreeEnsemble.load(trees_path)
+
+        trees = TreeEnsemble.from_model(model)
+        trees.save(trees_path)
+
+        return trees
+
+    def versions(self):
+        """
+        Method used to list the model versions available on disk.
+
+        Returns:
+        -----------------
+            versions (list): Versions sorted in ascending order
+        """
+
+        paths = glob.glob(os.path.join(self.models_path, "model_*.pkl"))
+
+        return sorted(os.path.basename(path)[len("model_"):-len(".pkl")] for path in paths)
+
+    def on_load(self, listener):
+        """
+        Method used to register a function called with the new ActiveModel
+        each time a model is loaded, e.g. to refresh data derived from it.
+
+        Parameters:
+        -----------------
+            listener (function): Function receiving the ActiveModel
+        """
+
+        self._listeners.append(listener)
+
+    def load(self, version):
+        """
+        Method used to load a model version and make it the active one.
+
+        Parameters:
+        -----------------
+            version (str): Model's version to load
+
+        Returns:
+        -----------------
+            previous (ActiveModel): The model replaced, None on the first load
+        """
+
+        path = self.model_path(version)
+
+        if not os.path.isfile(path):
+            raise FileNotFoundError("model's version {} not found".format(version))
+
+        # Loading out of the lock, the current model keeps serving meanwhile
+        model = joblib.load(path)
+        predictor = self.compile(path, model) if self.compiled else model
+
+        with self._lock:
+            previous = self._active
+            self._active = ActiveModel(str(version), model, predictor)
+            active = self._active
+
+        for listener in self._listeners:
+            listener(active)
+
+        return previous
+
+    @property
+    def active(self):
+        """
+        Active model, a request must keep this snapshot to use the same
+        version from the beginning to the end.
+        """
+
+        active = self._active
+
+        if active is None:
+            raise RuntimeError("no model loaded")
+
+        return active
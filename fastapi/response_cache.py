@@ -0,0 +1,193 @@
+import re
+import hashlib
+from collections import OrderedDict
+
+
+########################################################
+# Cache of the responses of the read-only EndPoints
+########################################################
+def etag(body):
+    """
+    Method used to calculate a strong ETag from the body of a response.
+
+    Parameters:
+    -----------------
+        body (bytes): Body of the response
+
+    Returns:
+    -----------------
+        etag (str): Quoted digest of the body
+    """
+
+    return '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+
+
+def etag_matches(if_none_match, value):
+    """
+    Method used to compare an If-None-Match header with an ETag.
+
+    Parameters:
+    -----------------
+        if_none_match (str): Header sent by the client, e.g. "a", W/"b"
+        value (str): ETag of the response
+
+    Returns:
+    -----------------
+        matches (bool): True when the client already has the response
+    """
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+
+    # If-None-Match uses the weak comparison
+    return "*" in tags or value in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+class ResponseCache:
+    """
+    Class used to keep the responses of the read-only EndPoints by path,
+    query and version of the data (datasets, model, day). Only the GET
+    responses with status 200 are kept, in a LRU of max_entries.
+
+    Parameters:
+    -----------------
+        paths (list): Regular expressions of the paths cached
+        version (function): Returns the version of the data the responses depend on
+        cache_control (str): Cache-Control header of the cached responses
+        max_entries (int): Maximum number of responses kept
+    """
+
+    def __init__(self, paths, version, cache_control="no-cache", max_entries=1024):
+        self.paths = [re.compile(path) for path in paths]
+        self.version = version
+        self.cache_control = cache_control
+        self.max_entries = max_entries
+        self._responses = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, scope):
+        return (
+            scope["type"] == "http" and scope["method"] == "GET"
+            and any(path.match(scope["path"]) for path in self.paths)
+        )
+
+    def key(self, scope):
+        return (scope["path"], scope["query_string"], self.version())
+
+    def get(self, key):
+        entry = self._responses.get(key)
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._responses.move_to_end(key)
+
+        return entry
+
+    def put(self, key, entry):
+        self._responses[key] = entry
+
+        while len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+    def clear(self):
+        self._responses.clear()
+
+    def stats(self):
+        """
+        Method used to get the metrics of the cache.
+
+        Returns:
+        -----------------
+            stats (dict): Responses kept, hits and misses
+        """
+
+        return {
+            "entries" : len(self._responses),
+            "maxEntries" : self.max_entries,
+            "hits" : self.hits,
+            "misses" : self.misses
+        }
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI middleware used to answer the read-only EndPoints from a
+    ResponseCache. The responses are sent with a strong ETag and a request
+    with the same If-None-Match gets a 304 without body.
+
+    Parameters:
+    -----------------
+        app (ASGI app): Application
+        cache (ResponseCache): Responses kept and paths cached
+    """
+
+    def __init__(self, app, cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if not self.cache.cacheable(scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = self.cache.key(scope)
+        headers = dict(scope["headers"])
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            await self._send(send, entry, if_none_match, b"HIT")
+            return
+
+        # Running the EndPoint, the response is captured to be kept
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(chunks)
+        response_headers = [
+            (name, value) for name, value in start.get("headers", [])
+            if name.lower() not in (b"content-length", b"etag", b"cache-control")
+        ]
+        entry = (start.get("status", 500), response_headers, body, etag(body))
+
+        if entry[0] == 200:
+            self.cache.put(key, entry)
+
+        await self._send(send, entry, if_none_match, b"MISS")
+
+    async def _send(self, send, entry, if_none_match, cache_status):
+        status, headers, body, value = entry
+
+        if status != 200:
+            await send({"type" : "http.response.start", "status" : status,
+                        "headers" : headers + [(b"content-length", str(len(body)).encode())]})
+            await send({"type" : "http.response.body", "body" : body})
+            return
+
+        headers = headers + [
+            (b"etag", value.encode()),
+            (b"cache-control", self.cache.cache_control.encode()),
+            (b"x-cache", cache_status),
+        ]
+
+        if if_none_match and etag_matches(if_none_match, value):
+            headers = [(name, header) for name, header in headers if name.lower() != b"content-type"]
+            await send({"type" : "http.response.start", "status" : 304, "headers" : headers})
+            await send({"type" : "http.response.body", "body" : b""})
+            return
+
+        await send({"type" : "http.response.start", "status" : 200,
+                    "headers" : headers + [(b"content-length", str(len(body)).encode())]})
+        await send({"type" : "http.response.body", "body" : body})
@@ -0,0 +1,96 @@
+import numpy as np
+
+
+########################################################
+# Vectorized scoring
+########################################################
+SCORE_DTYPE = np.dtype([
+    ("probability0", np.float64),
+    ("probability1", np.float64),
+    ("decision", np.int8),
+])
+
+
+def predict_proba_chunks(model, X, chunk_size=10000):
+    """
+    Method used to predict the probabilities of a DataFrame by chunks,
+    one vectorized predict_proba call per chunk.
+
+    Parameters:
+    -----------------
+        model (object): Model with a predict_proba method
+        X (pandas.DataFrame): Features of the clients, in the training order
+        chunk_size (int): Maximum number of rows by call
+
+    Returns:
+    -----------------
+        Generator of (start, result_proba) where start is the position of
+        the first row of the chunk.
+    """
+
+    for start in range(0, len(X), chunk_size):
+        yield start, model.predict_proba(X.iloc[start:start + chunk_size])
+
+
+class ScoreTable:
+    """
+    Class used to keep the scores of all the clients to predict, computed
+    once for a specific model's version.
+
+    Parameters:
+    -----------------
+        version (str): Model's version used to compute the scores
+        scores (numpy.ndarray): Array of SCORE_DTYPE, one record by client's position
+    """
+
+    def __init__(self, version, scores):
+        self.version = version
+        self.scores = scores
+
+    @classmethod
+    def compute(cls, active, X, threshold, chunk_size=10000):
+        """
+        Method used to score all the clients with a vectorized predict_proba.
+
+        Parameters:
+        -----------------
+            active (ActiveModel): Model and version to use
+            X (pandas.DataFrame): Features of the clients, in the training order
+            threshold (float): Threshold to decide whether the client will not repay
+            chunk_size (int): Maximum number of rows by predict_proba call
+
+        Returns:
+        -----------------
+            score_table (ScoreTable): Scores by client's position
+        """
+
+        scores = np.empty(len(X), dtype=SCORE_DTYPE)
+
+        for start, result_proba in predict_proba_chunks(active.predictor, X, chunk_size):
+            end = start + len(result_proba)
+            scores["probability0"][start:end] = result_proba[:, 0]
+            scores["probability1"][start:end] = result_proba[:, 1]
+            scores["decision"][start:end] = result_proba[:, 1] >= threshold
+
+        return cls(active.version, scores)
+
+    def lookup(self, position, version):
+        """
+        Method used to get the score of a client.
+
+        Parameters:
+        -----------------
+            position (int): Client's row position
+            version (str): Model's version expected
+
+        Returns:
+        -----------------
+            score (numpy.void): Record with probability0, probability1 and
+                                decision, None when the score is not available
+                                for this position/version.
+        """
+
+        if version != self.version or not 0 <= position < len(self.scores):
+            return None
+
+        return self.scores[position]
@@ -0,0 +1,354 @@
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+########################################################
+# Statistics served by the API
+########################################################
+# EndPoint name -> (column, key prefix of the response)
+STATISTICS = {
+    "ages" : ("AGE", "ages"),
+    "yearsEmployed" : ("YEARS_EMPLOYED", "years_employed"),
+    "amtCredits" : ("AMT_CREDIT", "amt_credit"),
+    "amtIncomes" : ("AMT_INCOME_TOTAL", "amt_income"),
+    "extSource2" : ("EXT_SOURCE_2", "ext_source_2"),
+    "extSource3" : ("EXT_SOURCE_3", "ext_source_3"),
+}
+
+
+def value_counts_dict(series):
+    """
+    Method used to count the clients by value, sorted by value.
+
+    Parameters:
+    -----------------
+        series (pandas.Series): Column to count
+
+    Returns:
+    -----------------
+        counts (dict): value -> number of clients, with Python types
+    """
+
+    counts = series.value_counts(sort=False).sort_index()
+
+    return dict(zip(counts.index.tolist(), counts.tolist()))
+
+
+def weighted_kde(values, counts, grid, chunk_size=1024):
+    """
+    Method used to calculate a gaussian KDE from a count histogram, the same
+    as a gaussian KDE (Scott's rule) over the values repeated count times but
+    without expanding them.
+
+    Parameters:
+    -----------------
+        values (numpy.ndarray): Distinct values
+        counts (numpy.ndarray): Number of clients by value
+        grid (numpy.ndarray): Points where the density is evaluated
+        chunk_size (int): Points of the grid evaluated at the same time
+
+    Returns:
+    -----------------
+        density (numpy.ndarray): Density on each point of the grid
+    """
+
+    n = counts.sum()
+    density = np.zeros(len(grid))
+
+    if n < 2:
+        return density
+
+    mean = np.sum(counts * values) / n
+    variance = np.sum(counts * (values - mean) ** 2) / (n - 1)
+    bandwidth = np.sqrt(variance) * n ** (-1 / 5)
+
+    if bandwidth == 0:
+        return density
+
+    norm = 1 / (n * bandwidth * np.sqrt(2 * np.pi))
+
+    for start in range(0, len(grid), chunk_size):
+        z = (grid[start:start + chunk_size, None] - values[None, :]) / bandwidth
+        density[start:start + chunk_size] = norm * (np.exp(-0.5 * z ** 2) @ counts)
+
+    return density
+
+
+def density_dict(repaid, not_repaid, points=500):
+    """
+    Method used to calculate the density curves of a feature by TARGET.
+
+    Parameters:
+    -----------------
+        repaid (pandas.Series): Feature of the clients who repaid
+        not_repaid (pandas.Series): Feature of the clients who did not repay
+        points (int): Number of points of the curves
+
+    Returns:
+    -----------------
+        density (dict): Grid and densities by TARGET
+    """
+
+    repaid = repaid.value_counts(sort=False)
+    not_repaid = not_repaid.value_counts(sort=False)
+    values = np.concatenate([repaid.index.to_numpy(dtype=np.float64), not_repaid.index.to_numpy(dtype=np.float64)])
+
+    if len(values) == 0:
+        return {"x" : [], "repaid" : [], "not_repaid" : []}
+
+    grid = np.linspace(values.min(), values.max(), points)
+
+    return {
+        "x" : grid.tolist(),
+        "repaid" : weighted_kde(repaid.index.to_numpy(dtype=np.float64), repaid.to_numpy(dtype=np.float64), grid).tolist(),
+        "not_repaid" : weighted_kde(not_repaid.index.to_numpy(dtype=np.float64), not_repaid.to_numpy(dtype=np.float64), grid).tolist()
+    }
+
+
+HISTOGRAM_METHODS = ("uniform", "quantile")
+
+
+def histogram_edges(values, bins, method):
+    """
+    Method used to calculate the bin edges of a feature.
+
+    Parameters:
+    -----------------
+        values (numpy.ndarray): Finite values of the feature
+        bins (int): Number of bins
+        method (str): "uniform" (same width) or "quantile" (same number of
+                      clients), the equal quantiles are merged
+
+    Returns:
+    -----------------
+        edges (numpy.ndarray): Bin edges, len(edges) - 1 bins
+    """
+
+    if method == "quantile":
+        return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+
+    return np.histogram_bin_edges(values, bins=bins)
+
+
+def histogram_dict(values, target, column, bins, method):
+    """
+    Method used to calculate the histogram of a feature by TARGET.
+
+    Parameters:
+    -----------------
+        values (numpy.ndarray): Values of the feature
+        target (numpy.ndarray): TARGET of the same clients
+        column (str): Feature's name
+        bins (int): Number of bins
+        method (str): "uniform" or "quantile"
+
+    Returns:
+    -----------------
+        histogram (dict): Edges and counts of clients by TARGET
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+
+    if finite.any():
+        edges = histogram_edges(values[finite], bins, method)
+    else:
+        edges = np.array([0.0, 1.0])
+
+    repaid = np.histogram(values[finite & (target == 0)], bins=edges)[0]
+    not_repaid = np.histogram(values[finite & (target == 1)], bins=edges)[0]
+
+    return {
+        "feature" : column,
+        "method" : method,
+        "bins" : len(edges) - 1,
+        "edges" : edges.tolist(),
+        "repaid" : repaid.tolist(),
+        "not_repaid" : not_repaid.tolist()
+    }
+
+
+class StatisticsCache:
+    """
+    Class used to compute the distributions of the current clients once
+    and keep them serialized as JSON.
+
+    The payloads only change when the dataset is reloaded, then build() is
+    called again and replaces all of them at once.
+
+    Parameters:
+    -----------------
+        statistics (dict): EndPoint name -> (column, key prefix of the response)
+    """
+
+    def __init__(self, statistics=STATISTICS, max_histograms=256):
+        self.statistics = statistics
+        self.max_histograms = max_histograms
+        self.version = None
+        # Incremented at each build, the dataset's version can stay the same
+        self.generation = 0
+        self._df = None
+        self._dataset = None
+        self._payloads = {}
+        self._densities = {}
+        self._sorted = {}
+        self._histograms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(self, df, version, dataset=None):
+        """
+        Method used to compute all the distributions, by TARGET.
+
+        Parameters:
+        -----------------
+            df (pandas.DataFrame): Current clients with the TARGET column
+            version (str): Dataset's version, e.g. its file name
+            dataset (ColumnarDataset): Complete dataset, in the same row order,
+                                       to read on demand the columns not in df
+        """
+
+        repaid = df[df["TARGET"] == 0]
+        not_repaid = df[df["TARGET"] == 1]
+
+        payloads = {}
+        for name, (column, prefix) in self.statistics.items():
+            payloads[name] = json.dumps({
+                prefix + "_repaid" : value_counts_dict(repaid[column]),
+                prefix + "_not_repaid" : value_counts_dict(not_repaid[column])
+            }, separators=(",", ":")).encode("utf-8")
+
+        densities = {}
+        for name, (column, prefix) in self.statistics.items():
+            densities[name] = json.dumps(
+                density_dict(repaid[column], not_repaid[column]), separators=(",", ":")
+            ).encode("utf-8")
+
+        # Values of all the current clients sorted, to get a client's percentile
+        sorted_values = {}
+        for name, (column, prefix) in self.statistics.items():
+            sorted_values[name] = np.sort(df[column].dropna().to_numpy(dtype=np.float64))
+
+        with self._lock:
+            self._df = df
+            self._dataset = dataset
+            self._payloads = payloads
+            self._densities = densities
+            self._sorted = sorted_values
+            self.generation += 1
+            self._histograms = OrderedDict()
+            self.version = version
+
+    def payload(self, name):
+        """
+        Method used to get a distribution already serialized.
+
+        Parameters:
+        -----------------
+            name (str): EndPoint name, e.g. "ages"
+
+        Returns:
+        -----------------
+            payload (bytes): JSON of the distribution
+        """
+
+        return self._payloads[name]
+
+    def density(self, name):
+        """
+        Method used to get the density curves of a distribution already serialized.
+
+        Parameters:
+        -----------------
+            name (str): EndPoint name, e.g. "ages"
+
+        Returns:
+        -----------------
+            payload (bytes): JSON with x, repaid and not_repaid
+        """
+
+        return self._densities[name]
+
+    def percentile(self, name, value):
+        """
+        Method used to get the percentile rank of a value in a distribution,
+        the percentage of current clients with a lower or equal value.
+
+        Parameters:
+        -----------------
+            name (str): EndPoint name, e.g. "ages"
+            value (float): Client's value
+
+        Returns:
+        -----------------
+            percentile (float): Between 0 and 100, None for a missing value
+        """
+
+        values = self._sorted[name]
+
+        if value is None or np.isnan(value) or not len(values):
+            return None
+
+        return 100 * np.searchsorted(values, value, side="right") / len(values)
+
+    def columns(self):
+        """
+        Method used to list the numeric features available for histograms.
+
+        Returns:
+        -----------------
+            columns (list): Numeric columns of the dataset
+        """
+
+        columns = self._df.select_dtypes(include="number").columns.tolist()
+
+        if self._dataset is not None:
+            columns += [col for col in self._dataset.columns if col not in columns]
+
+        return columns
+
+    def histogram(self, column, bins, method):
+        """
+        Method used to get the histogram of a feature by TARGET, serialized
+        as JSON. The payload size depends only on the number of bins, the
+        last histograms requested are kept in memory.
+
+        Parameters:
+        -----------------
+            column (str): Numeric feature of the dataset
+            bins (int): Number of bins
+            method (str): "uniform" or "quantile"
+
+        Returns:
+        -----------------
+            payload (bytes): JSON of the histogram
+        """
+
+        key = (column, bins, method)
+
+        with self._lock:
+            histograms = self._histograms
+            df = self._df
+            dataset = self._dataset
+            if key in histograms:
+                histograms.move_to_end(key)
+                return histograms[key]
+
+        if column in df.columns:
+            values = df[column].to_numpy()
+        else:
+            values = dataset.column(column)
+
+        payload = json.dumps(
+            histogram_dict(values, df["TARGET"].to_numpy(), column, bins, method), separators=(",", ":")
+        ).encode("utf-8")
+
+        with self._lock:
+            # Only kept when the dataset didn't change meanwhile
+            if histograms is self._histograms:
+                histograms[key] = payload
+                if len(histograms) > self.max_histograms:
+                    histograms.popitem(last=False)
+
+        return payload
@@ -0,0 +1,72 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules of the API are imported by name, like uvicorn main:app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_clients(n, start_id, rng):
+    """
+    Method used to create clients with the columns read by the API and a few
+    model's features, like df_clients_to_predict.
+
+    Parameters:
+    -----------------
+        n (int): Number of clients
+        start_id (int): First SK_ID_CURR
+        rng (numpy.random.Generator): Random values
+
+    Returns:
+    -----------------
+        df (pandas.DataFrame): Clients
+    """
+
+    df = pd.DataFrame({
+        "SK_ID_CURR": np.arange(start_id, start_id + n),
+        "AMT_INCOME_TOTAL": rng.choice([90000.0, 135000.0, 180000.0, 270000.0], n),
+        "CODE_GENDER": rng.integers(0, 2, n),
+        "DAYS_BIRTH": -rng.integers(7000, 25000, n),
+        "DAYS_REGISTRATION": -rng.integers(0, 15000, n).astype(float),
+        "DAYS_EMPLOYED": -rng.integers(0, 15000, n),
+        "AMT_CREDIT": rng.choice(np.arange(45000, 2000000, 4500.0), n),
+        "AMT_GOODS_PRICE": rng.choice(np.arange(45000, 2000000, 4500.0), n),
+        "EXT_SOURCE_2": rng.uniform(0, 0.85, n),
+        "EXT_SOURCE_3": rng.uniform(0, 0.9, n),
+    })
+
+    for i in range(5):
+        df["FEATURE_{}".format(i)] = rng.normal(size=n)
+
+    return df
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """
+    The API's main module, imported in a folder of synthetic datasets. The
+    startup events (model, SHAP values, statistics) only run in a
+    `with TestClient(...)` block.
+    """
+
+    folder = tmp_path_factory.mktemp("api")
+    os.makedirs(folder / "datasets")
+    os.makedirs(folder / "models")
+
+    rng = np.random.default_rng(0)
+    current_clients = synthetic_clients(500, 100000, rng)
+    current_clients.insert(1, "TARGET", rng.integers(0, 2, len(current_clients)))
+
+    synthetic_clients(300, 400000, rng).to_csv(folder / "datasets" / "df_clients_to_predict_20220221.csv", index=False)
+    current_clients.to_csv(folder / "datasets" / "df_current_clients_20220221.csv", index=False)
+
+    cwd = os.getcwd()
+    os.chdir(folder)
+
+    try:
+        import main
+        yield main
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from atomic_file import atomic_path
+
+
+def test_replaces_the_file_at_the_end(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text("old")
+
+    with atomic_path(str(path)) as tmp:
+        with open(tmp, "w") as f:
+            f.write("new")
+        # Not replaced yet, a reader still sees the old content
+        assert path.read_text() == "old"
+
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["data.json"]
+
+
+def test_removes_the_temporary_file_on_failure(tmp_path):
+    path = tmp_path / "data.json"
+
+    with pytest.raises(RuntimeError):
+        with atomic_path(str(path)) as tmp:
+            with open(tmp, "w") as f:
+                f.write("partial")
+            raise RuntimeError("failed")
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_concurrent_writers_use_their_own_temporary_file(tmp_path):
+    path = str(tmp_path / "data.bin")
+
+    def write(i):
+        with atomic_path(path) as tmp:
+            with open(tmp, "wb") as f:
+                for _ in range(100):
+                    f.write(bytes([i]) * 1000)
+        return tmp
+
+    with ThreadPoolExecutor(8) as pool:
+        tmp_paths = list(pool.map(write, range(16)))
+
+    content = open(path, "rb").read()
+
+    assert len(set(tmp_paths)) == 16
+    assert len(content) == 100000 and len(set(content)) == 1
+    assert os.listdir(tmp_path) == ["data.bin"]
@@ -0,0 +1,73 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+WORKERS = 32
+ROUNDS = 10
+
+
+def concurrent_results(fn, keys, rounds=ROUNDS, workers=WORKERS):
+    # Every key several times, shuffled, from many threads at the same time
+    order = list(keys) * rounds
+    random.Random(0).shuffle(order)
+
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(lambda key: (key, fn(key)), order))
+
+
+@pytest.fixture
+def records(api):
+    rng = np.random.default_rng(1)
+    n = 200
+
+    values = {
+        "SK_ID_CURR" : np.arange(900000, 900000 + n),
+        "AMT_INCOME_TOTAL" : rng.uniform(50000, 300000, n),
+        "CODE_GENDER" : rng.integers(0, 2, n),
+        "DAYS_BIRTH" : -rng.integers(7000, 25000, n).astype(float),
+        "DAYS_REGISTRATION" : -rng.uniform(0, 15000, n),
+        "DAYS_EMPLOYED" : np.where(rng.random(n) < 0.1, np.nan, -rng.integers(0, 15000, n)),
+        "AMT_CREDIT" : rng.uniform(45000, 2000000, n),
+        "AMT_GOODS_PRICE" : rng.uniform(45000, 2000000, n),
+        "EXT_SOURCE_2" : rng.uniform(0, 1, n),
+        "EXT_SOURCE_3" : rng.uniform(0, 1, n),
+    }
+
+    return np.rec.fromarrays([values[col] for col in api.COLUMNS], names=api.COLUMNS)
+
+
+def test_client_details_dict_concurrent_equals_serial(api, records):
+    today = date(2024, 2, 29)
+
+    expected = [api.client_details_dict(record, i, today) for i, record in enumerate(records)]
+
+    results = concurrent_results(lambda i: api.client_details_dict(records[i], i, today), range(len(records)))
+
+    assert len(results) == ROUNDS * len(records)
+    assert [result for i, result in results if result != expected[i]] == []
+    assert expected[0]["clientId"] == 900000
+
+
+def test_client_details_endpoint_concurrent_equals_serial(api, monkeypatch):
+    # Every request runs the EndPoint, none is served by the responses' cache
+    monkeypatch.setattr(api.response_cache, "cacheable", lambda scope: False)
+
+    # Without `with`, the startup events (model, statistics) don't run
+    client = TestClient(api.app)
+    ids = api.clients_index.ids.tolist()
+
+    def get(client_id):
+        response = client.get("/api/clients/{}".format(client_id))
+        assert response.status_code == 200 and "x-cache" not in response.headers
+        return response.json()
+
+    expected = {client_id : get(client_id) for client_id in ids}
+
+    results = concurrent_results(get, ids)
+
+    assert len(results) == ROUNDS * len(ids)
+    assert [result for client_id, result in results if result != expected[client_id]] == []
+    assert all(expected[client_id]["clientId"] == client_id for client_id in ids)
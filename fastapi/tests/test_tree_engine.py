@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from lightgbm import LGBMClassifier
+from tree_engine import ZERO_THRESHOLD, TreeEnsemble
+
+ROWS = 2000
+FEATURES = 8
+ATOL = 1e-12
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    rng = np.random.default_rng(0)
+
+    X = rng.normal(size=(ROWS, FEATURES))
+    X[rng.random(X.shape) < 0.15] = np.nan
+    X[rng.random(X.shape) < 0.15] = 0.0
+    # Without missing-values in training, the splits of the last feature have no missing type
+    X[:, -1] = rng.normal(size=ROWS)
+    y = (np.nan_to_num(X[:, 0]) + np.nan_to_num(X[:, 1]) * (X[:, 2] == 0) + rng.normal(scale=0.5, size=ROWS) > 0).astype(int)
+
+    # Rows of NaN, of zeros and values on both sides of the zero threshold
+    X_test = np.vstack([
+        rng.normal(size=(500, FEATURES)),
+        np.where(rng.random((500, FEATURES)) < 0.3, np.nan, rng.normal(size=(500, FEATURES))),
+        np.full((1, FEATURES), np.nan),
+        np.zeros((1, FEATURES)),
+        np.full((1, FEATURES), ZERO_THRESHOLD),
+        np.full((1, FEATURES), -ZERO_THRESHOLD),
+        np.full((1, FEATURES), np.nextafter(ZERO_THRESHOLD, 1)),
+        np.full((1, FEATURES), -np.nextafter(ZERO_THRESHOLD, 1)),
+        np.full((1, FEATURES), 1e-35),
+        np.full((1, FEATURES), -1e-35),
+    ])
+
+    columns = ["feature_{}".format(i) for i in range(FEATURES)]
+
+    return pd.DataFrame(X, columns=columns), y, pd.DataFrame(X_test, columns=columns)
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["zero", "zero_as_missing"])
+def model(request, dataset):
+    X, y, _ = dataset
+    model = LGBMClassifier(n_estimators=50, num_leaves=15, min_child_samples=5, zero_as_missing=request.param, verbose=-1)
+    return model.fit(X, y)
+
+
+@pytest.fixture
+def trees(model, tmp_path):
+    # Compiled, saved and loaded like the registry does
+    path = str(tmp_path / "model.trees.npz")
+    TreeEnsemble.from_model(model).save(path)
+    return TreeEnsemble.load(path)
+
+
+def test_predict_proba_equals_the_model(model, trees, dataset):
+    _, _, X_test = dataset
+
+    diff = np.abs(trees.predict_proba(X_test) - model.predict_proba(X_test)).max()
+
+    assert diff <= ATOL
+
+
+def test_contributions_add_up_to_the_raw_score(model, trees, dataset):
+    _, _, X_test = dataset
+
+    contributions, bias = trees.predict_contrib_approximate(X_test)
+
+    np.testing.assert_allclose(contributions.sum(axis=1) + bias, model.predict_proba(X_test, raw_score=True), rtol=0, atol=1e-9)
+
+
+def test_empty_batch(trees, dataset):
+    _, _, X_test = dataset
+
+    assert trees.predict_proba(X_test.iloc[:0]).shape == (0, 2)
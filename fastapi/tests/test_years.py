@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from years import calculate_years
+
+
+def calculate_years_scalar(days, today):
+    # Reference: the implementation with the date arithmetic of Python
+    initial_date = today - timedelta(abs(days))
+
+    return today.year - initial_date.year - ((today.month, today.day) < (initial_date.month, initial_date.day))
+
+
+# A leap day and the days around the changes of month and year
+TODAYS = [date(2024, 2, 29), date(2023, 2, 28), date(2023, 3, 1), date(2022, 12, 31), date(2020, 1, 1)]
+
+
+@pytest.fixture(scope="module")
+def days():
+    rng = np.random.default_rng(0)
+
+    return np.concatenate([
+        rng.integers(-30000, 1, 20000).astype(np.float64),
+        rng.uniform(-30000, 0, 20000),
+        [0, -0.5, -1, -365, -366, -1461, 1, 365243],
+    ])
+
+
+@pytest.mark.parametrize("today", TODAYS)
+def test_array_equals_scalar_reference(days, today):
+    expected = np.array([calculate_years_scalar(value, today) for value in days])
+
+    result = calculate_years(days, today)
+
+    assert result.dtype == np.int64
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("today", TODAYS)
+def test_scalar_equals_scalar_reference(days, today):
+    for value in days[::997]:
+        assert calculate_years(value, today) == calculate_years_scalar(value, today)
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf])
+def test_missing_scalar_gives_none(value):
+    assert calculate_years(value, date(2024, 2, 29)) is None
+
+
+def test_missing_values_are_masked_in_an_array():
+    today = date(2024, 2, 29)
+
+    result = calculate_years([-10000, np.nan, -np.inf, -400], today)
+
+    assert np.isnan(result[1:3]).all()
+    assert result[0] == calculate_years_scalar(-10000, today)
+    assert result[3] == calculate_years_scalar(-400, today)
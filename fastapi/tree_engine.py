@@ -0,0 +1,397 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import joblib
+from atomic_file import atomic_path
+
+
+########################################################
+# Native evaluation of the LightGBM trees with NumPy
+########################################################
+MISSING_TYPES = {"None" : 0, "Zero" : 1, "NaN" : 2}
+# kZeroThreshold of LightGBM, a float (1e-35f) compared as a double
+ZERO_THRESHOLD = float(np.float32(1e-35))
+
+
+def compiled_path(model_path):
+    """
+    Method used to get the path of the compiled trees of a model.
+
+    Parameters:
+    -----------------
+        model_path (str): Path of the model's pickle, e.g. models/model_20220220.pkl
+
+    Returns:
+    -----------------
+        path (str): Path of the arrays, e.g. models/model_20220220.trees.npz
+    """
+
+    return os.path.splitext(model_path)[0] + ".trees.npz"
+
+
+def lightgbm_booster(model):
+    """
+    Method used to get the booster of a LGBMClassifier, alone or as the last
+    step of a Pipeline whose other steps are samplers (skipped to predict).
+
+    Parameters:
+    -----------------
+        model (object): LGBMClassifier or Pipeline
+
+    Returns:
+    -----------------
+        booster (lightgbm.Booster): Trained booster
+    """
+
+    if hasattr(model, "steps"):
+        for name, step in model.steps[:-1]:
+            if step is not None and step != "passthrough" and not hasattr(step, "fit_resample"):
+                raise ValueError("step {} transforms the features, it can't be compiled".format(name))
+        model = model.steps[-1][1]
+
+    if hasattr(model, "booster_"):
+        return model.booster_
+
+    return model
+
+
+class TreeEnsemble:
+    """
+    Class used to evaluate a binary LightGBM model from contiguous NumPy
+    arrays, all the trees at the same time, one level of depth by step.
+
+    Internal nodes of all the trees share the same arrays; a child (or a
+    root) >= 0 is an internal node and a negative value -(leaf + 1) is a leaf.
+    """
+
+    ARRAYS = [
+        "roots", "split_feature", "threshold", "default_left", "missing_type",
+        "left_child", "right_child", "leaf_value",
+    ]
+
+    def __init__(self, roots, split_feature, threshold, default_left, missing_type,
+                 left_child, right_child, leaf_value, sigmoid=1.0, max_depth=0, feature_names=(),
+                 internal_value=None):
+        self.roots = roots
+        self.split_feature = split_feature
+        self.threshold = threshold
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.left_child = left_child
+        self.right_child = right_child
+        self.leaf_value = leaf_value
+        self.sigmoid = float(sigmoid)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+        # Values of the internal nodes, only used to approximate the contributions
+        self.internal_value = internal_value
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Method used to flatten the trees of a trained model.
+
+        Parameters:
+        -----------------
+            model (object): LGBMClassifier, Pipeline or lightgbm.Booster
+
+        Returns:
+        -----------------
+            trees (TreeEnsemble): Compiled model
+        """
+
+        dump = lightgbm_booster(model).dump_model()
+
+        objective = dump.get("objective", "").split()
+        if not objective or objective[0] != "binary":
+            raise ValueError("only binary models can be compiled")
+        sigmoid = dict(param.split(":") for param in objective[1:] if ":" in param).get("sigmoid", 1.0)
+
+        nodes = {name : [] for name in ["split_feature", "threshold", "default_left", "missing_type", "left_child", "right_child", "internal_value"]}
+        leaf_value = []
+        roots = []
+        max_depth = 0
+
+        def flatten(node, depth):
+            nonlocal max_depth
+            max_depth = max(max_depth, depth)
+
+            if "split_index" not in node:
+                leaf_value.append(node["leaf_value"])
+                return -len(leaf_value)
+
+            if node["decision_type"] != "<=":
+                raise ValueError("categorical splits are not supported")
+
+            index = len(nodes["threshold"])
+            nodes["split_feature"].append(node["split_feature"])
+            nodes["threshold"].append(node["threshold"])
+            nodes["default_left"].append(node["default_left"])
+            nodes["missing_type"].append(MISSING_TYPES[node["missing_type"]])
+            nodes["internal_value"].append(node["internal_value"])
+            nodes["left_child"].append(0)
+            nodes["right_child"].append(0)
+
+            nodes["left_child"][index] = flatten(node["left_child"], depth + 1)
+            nodes["right_child"][index] = flatten(node["right_child"], depth + 1)
+
+            return index
+
+        for tree in dump["tree_info"]:
+            roots.append(flatten(tree["tree_structure"], 0))
+
+        return cls(
+            roots=np.array(roots, dtype=np.int64),
+            split_feature=np.array(nodes["split_feature"], dtype=np.int64),
+            threshold=np.array(nodes["threshold"], dtype=np.float64),
+            default_left=np.array(nodes["default_left"], dtype=bool),
+            missing_type=np.array(nodes["missing_type"], dtype=np.int8),
+            left_child=np.array(nodes["left_child"], dtype=np.int64),
+            right_child=np.array(nodes["right_child"], dtype=np.int64),
+            leaf_value=np.array(leaf_value, dtype=np.float64),
+            sigmoid=sigmoid,
+            max_depth=max_depth,
+            feature_names=dump.get("feature_names", []),
+            internal_value=np.array(nodes["internal_value"], dtype=np.float64),
+        )
+
+    def save(self, path):
+        """
+        Method used to save the compiled model as a NumPy archive, written
+        atomically: several workers may compile the same model at startup.
+
+        Parameters:
+        -----------------
+            path (str): Path of the .npz file
+        """
+
+        optional = {"internal_value" : self.internal_value} if self.internal_value is not None else {}
+
+        # A file object, np.savez would add .npz to the temporary file's name
+        with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+            np.savez(
+                f, **{name : getattr(self, name) for name in self.ARRAYS}, **optional,
+                sigmoid=self.sigmoid, max_depth=self.max_depth,
+                feature_names=np.array(self.feature_names, dtype=str),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Method used to load a compiled model.
+
+        Parameters:
+        -----------------
+            path (str): Path of the .npz file
+
+        Returns:
+        -----------------
+            trees (TreeEnsemble): Compiled model
+        """
+
+        with np.load(path) as arrays:
+            return cls(
+                **{name : arrays[name] for name in cls.ARRAYS},
+                sigmoid=float(arrays["sigmoid"]), max_depth=int(arrays["max_depth"]),
+                feature_names=arrays["feature_names"].tolist(),
+                internal_value=arrays["internal_value"] if "internal_value" in arrays else None,
+            )
+
+    def _step(self, X, rows, node):
+        # Moving each (row, tree) one level down, the leaves stay in place
+        internal = node >= 0
+        idx = np.where(internal, node, 0)
+        fval = X[rows, self.split_feature[idx]]
+        missing_type = self.missing_type[idx]
+
+        # The predictor of LightGBM drops the features in [-kZeroThreshold,
+        # kZeroThreshold] from the row, they are read as 0
+        nan = np.isnan(fval)
+        zero = (fval >= -ZERO_THRESHOLD) & (fval <= ZERO_THRESHOLD)
+        fval = np.where(zero, 0.0, fval)
+
+        # Same rules as LightGBM NumericalDecision
+        fval = np.where(nan & (missing_type != 2), 0.0, fval)
+        zero = zero | (nan & (missing_type != 2))
+        default = ((missing_type == 1) & zero) | ((missing_type == 2) & nan)
+        go_left = np.where(default, self.default_left[idx], fval <= self.threshold[idx])
+
+        child = np.where(go_left, self.left_child[idx], self.right_child[idx])
+
+        return internal, idx, np.where(internal, child, node)
+
+    def _node_value(self, node):
+        # Value of internal nodes (>= 0) and of leaves (< 0)
+        return np.where(
+            node >= 0,
+            self.internal_value[np.where(node >= 0, node, 0)],
+            self.leaf_value[np.where(node < 0, -node - 1, 0)],
+        )
+
+    def predict_raw(self, X):
+        """
+        Method used to calculate the raw score (sum of the leaves) of each row.
+
+        Parameters:
+        -----------------
+            X (numpy.ndarray): Features in the training order, shape (rows, features)
+
+        Returns:
+        -----------------
+            raw (numpy.ndarray): Raw score by row
+        """
+
+        rows = np.arange(len(X))[:, None]
+        node = np.repeat(self.roots[None, :], len(X), axis=0)
+
+        for _ in range(self.max_depth):
+            if not (node >= 0).any():
+                break
+            _, _, node = self._step(X, rows, node)
+
+        return self.leaf_value[-node - 1].sum(axis=1)
+
+    def predict_contrib_approximate(self, X):
+        """
+        Method used to approximate the contribution of each feature to the
+        raw score (Saabas method): along the path of a row, the change of
+        value from a node to its child is given to the feature of the split.
+        It is much cheaper than the exact SHAP values.
+
+        Parameters:
+        -----------------
+            X (pandas.DataFrame or numpy.ndarray): Features in the training order
+
+        Returns:
+        -----------------
+            (contributions, bias): Contributions of shape (rows, features) and
+                                   the bias, bias + contributions = raw score
+        """
+
+        if self.internal_value is None:
+            raise ValueError("the compiled model has no internal values, it must be exported again")
+
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+
+        n_rows, n_features = X.shape
+        rows = np.arange(n_rows)[:, None]
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+        contributions = np.zeros(n_rows * n_features)
+
+        for _ in range(self.max_depth):
+            if not (node >= 0).any():
+                break
+
+            internal, idx, child = self._step(X, rows, node)
+            change = self._node_value(child) - self._node_value(node)
+            cell = rows * n_features + self.split_feature[idx]
+            contributions += np.bincount(cell[internal], weights=change[internal], minlength=len(contributions))
+            node = child
+
+        bias = float(self._node_value(self.roots).sum())
+
+        return contributions.reshape(n_rows, n_features), bias
+
+    def predict_proba(self, X, chunk_size=1024):
+        """
+        Method used to predict the probabilities like LGBMClassifier.predict_proba.
+
+        Parameters:
+        -----------------
+            X (pandas.DataFrame or numpy.ndarray): Features in the training order
+            chunk_size (int): Rows evaluated at the same time, it bounds the memory
+
+        Returns:
+        -----------------
+            result_proba (numpy.ndarray): Probabilities of the class 0 and 1
+        """
+
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+
+        raw = np.concatenate([
+            self.predict_raw(X[start:start + chunk_size]) for start in range(0, len(X), chunk_size)
+        ]) if len(X) else np.empty(0)
+
+        probability1 = 1 / (1 + np.exp(-self.sigmoid * raw))
+
+        return np.column_stack([1 - probability1, probability1])
+
+
+def export(model_path):
+    """
+    Method used to compile a model's pickle, the arrays are saved next to it.
+
+    Parameters:
+    -----------------
+        model_path (str): Path of the model's pickle
+
+    Returns:
+    -----------------
+        path (str): Path of the compiled model
+    """
+
+    path = compiled_path(model_path)
+    TreeEnsemble.from_model(joblib.load(model_path)).save(path)
+
+    return path
+
+
+def benchmark(model, trees, X, repeat=20):
+    """
+    Method used to compare the compiled model with the model's predict_proba,
+    numerical parity and latency of a single row and of the whole batch.
+
+    Parameters:
+    -----------------
+        model (object): Model with predict_proba
+        trees (TreeEnsemble): Same model compiled
+        X (pandas.DataFrame): Features in the training order
+        repeat (int): Number of single-row predictions timed
+
+    Returns:
+    -----------------
+        results (dict): Max absolute difference and latencies in ms
+    """
+
+    def timed(fn, *args):
+        t0 = time.perf_counter()
+        fn(*args)
+        return 1000 * (time.perf_counter() - t0)
+
+    expected = model.predict_proba(X)
+    result = trees.predict_proba(X)
+
+    single = X.iloc[[0]]
+
+    return {
+        "rows" : len(X),
+        "maxAbsDiff" : float(np.abs(expected - result).max()),
+        "singleRowModelMs" : float(np.median([timed(model.predict_proba, single) for _ in range(repeat)])),
+        "singleRowCompiledMs" : float(np.median([timed(trees.predict_proba, single) for _ in range(repeat)])),
+        "batchModelMs" : timed(model.predict_proba, X),
+        "batchCompiledMs" : timed(trees.predict_proba, X),
+    }
+
+
+if __name__ == "__main__":
+    # python tree_engine.py export models/model_20220220.pkl
+    # python tree_engine.py benchmark models/model_20220220.pkl datasets/df_clients_to_predict_20220221.csv
+    command = sys.argv[1]
+
+    model_path = sys.argv[2]
+
+    if command == "export":
+        print("{} -> {}".format(model_path, export(model_path)))
+    elif command == "benchmark":
+        model = joblib.load(model_path)
+        X = pd.read_csv(sys.argv[3]).iloc[:, 2:]
+        for key, value in benchmark(model, TreeEnsemble.from_model(model), X).items():
+            print("{}:\t{}".format(key, value))
+    else:
+        raise SystemExit("unknown command: {}".format(command))
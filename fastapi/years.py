@@ -0,0 +1,47 @@
+import numpy as np
+from datetime import date
+
+
+########################################################
+# Years from numbers of days
+########################################################
+def calculate_years(days, today=None):
+    """
+    Method used to calculate years based on date (today - quantity of days).
+    It is vectorized with NumPy, days can be a single value or an array.
+
+    Parameters:
+    -----------------
+        days (int or array-like): Numbers of day to rest of today
+        today (datetime.date): Reference date, by default the current day
+
+    Returns:
+    -----------------
+        years (int or numpy.ndarray): Numbers of years, None (or NaN in an
+                                      array) for a missing or infinite value
+    """
+
+    today = today or date.today()
+    days = np.asarray(days, dtype=np.float64)
+
+    # NaN and inf can't be converted to a date, they are masked at the end
+    finite = np.isfinite(days)
+
+    # Like date - timedelta(days), the fraction of day is ignored
+    initial_date = np.datetime64(today, "D") - np.trunc(np.abs(np.where(finite, days, 0))).astype("timedelta64[D]")
+
+    initial_year = initial_date.astype("datetime64[Y]")
+    initial_month = initial_date.astype("datetime64[M]")
+
+    year = initial_year.astype(np.int64) + 1970
+    month = (initial_month - initial_year.astype("datetime64[M]")).astype(np.int64) + 1
+    day = (initial_date - initial_month.astype("datetime64[D]")).astype(np.int64) + 1
+
+    birthday_not_reached = (today.month < month) | ((today.month == month) & (today.day < day))
+    years = today.year - year - birthday_not_reached
+
+    if years.ndim == 0:
+        return int(years) if finite else None
+
+    # Integers when all the values are known, like date arithmetic
+    return years if finite.all() else np.where(finite, years, np.nan)
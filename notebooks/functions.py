@@ -1,7 +1,10 @@
 # General
 import io
+import os
 import gc
 import timeit
+import tempfile
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
 from math import prod
@@ -57,6 +60,37 @@ def memory_optimization(df):
     return df
 
 
+@contextmanager
+def atomic_path(path):
+    """
+    Method used to write a file atomically: the content is written to a
+    temporary file with a unique name in the same folder, which replaces the
+    file at the end. A reader never sees a partial file, the temporary file
+    is removed on failure.
+
+    Parameters:
+    -----------------
+        path (str): Path of the file
+
+    Returns:
+    -----------------
+        tmp_path (str): Path to write the content to
+    """
+
+    folder, name = os.path.split(os.path.abspath(path))
+
+    with tempfile.NamedTemporaryFile(dir=folder, prefix=name + ".", suffix=".tmp", delete=False) as f:
+        tmp_path = f.name
+
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def df_analysis(df, name_df, *args, **kwargs):
     """
     Method used to analyze on the DataFrame.
@@ -0,0 +1,80 @@
+# General
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+## Own specific functions
+from schemas import read_table
+
+
+########################################################
+# Features of each installment payment
+########################################################
+def installments_features(ins):
+    """
+    Method used to add the features of each installment, row by row, with
+    vectorized operations.
+
+    Parameters:
+    -----------------
+        ins (pandas.DataFrame): Installments payments
+
+    Returns:
+    -----------------
+        ins (pandas.DataFrame): Installments payments with the new features
+    """
+
+    # Percentage and difference paid in each installment (amount paid and installment value)
+    ins['PAYMENT_PERC'] = ins['AMT_PAYMENT'] / ins['AMT_INSTALMENT']
+    ins['PAYMENT_DIFF'] = ins['AMT_INSTALMENT'] - ins['AMT_PAYMENT']
+
+    # Days past due and days before due (no negative values)
+    # NaN > 0 is False, a missing payment date gives 0 like x if x > 0 else 0
+    # float64 like the Series returned by apply
+    dpd = (ins['DAYS_ENTRY_PAYMENT'] - ins['DAYS_INSTALMENT']).to_numpy(dtype=np.float64)
+    dbd = (ins['DAYS_INSTALMENT'] - ins['DAYS_ENTRY_PAYMENT']).to_numpy(dtype=np.float64)
+    ins['DPD'] = np.where(dpd > 0, dpd, 0)
+    ins['DBD'] = np.where(dbd > 0, dbd, 0)
+
+    return ins
+
+
+def benchmark(ins, repeat=3):
+    """
+    Method used to time installments_features, best time of several runs.
+    Its exact equality with the lambdas of the Kernel is checked by
+    tests/test_installments.py.
+
+    Parameters:
+    -----------------
+        ins (pandas.DataFrame): Installments payments
+        repeat (int): Number of times the features are timed
+
+    Returns:
+    -----------------
+        results (dict): Rows, time in ms and rows by second
+    """
+
+    times = []
+    for _ in range(repeat):
+        df = ins.copy()
+        t0 = time.perf_counter()
+        installments_features(df)
+        times.append(1000 * (time.perf_counter() - t0))
+
+    return {
+        "rows" : len(ins),
+        "vectorizedMs" : min(times),
+        "rowsBySecond" : 1000 * len(ins) / min(times),
+    }
+
+
+if __name__ == "__main__":
+    # python installments.py [datasets/initials_datasets/installments_payments.csv] [rows]
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("datasets", "initials_datasets", "installments_payments.csv")
+    num_rows = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    for key, value in benchmark(read_table(path, num_rows)).items():
+        print("{}:\t{}".format(key, value))
@@ -0,0 +1,456 @@
+# General
+import os
+import sys
+import gc
+import json
+import hashlib
+import inspect
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+import psutil
+import pyarrow.feather as feather
+
+## Own specific functions
+from functions import memory_usage, atomic_path
+from preprocessing import *
+from streaming import StreamingAggregation
+import schemas
+
+
+########################################################
+# Incremental feature engineering with cached artifacts
+########################################################
+ARTIFACTS_PATH = os.path.join("datasets", "artifacts")
+INDEX_COLUMN = "__index__"
+
+# Peak memory of a step never run, by byte of its input files
+MEMORY_BY_INPUT_BYTE = 5
+
+Step = namedtuple("Step", ["name", "function", "inputs", "title"])
+
+# Tables joined on SK_ID_CURR, in the order of the notebook's main()
+STEPS = [
+    Step("application_train_test", application_train_test, ["application_train.csv", "application_test.csv"], "Process Train/Test df"),
+    Step("bureau_and_balance", bureau_and_balance, ["bureau.csv", "bureau_balance.csv"], "Process bureau and bureau_balance"),
+    Step("previous_applications", previous_applications, ["previous_application.csv"], "Process previous_applications"),
+    Step("pos_cash", pos_cash, ["POS_CASH_balance.csv"], "Process POS-CASH balance"),
+    Step("installments_payments", installments_payments, ["installments_payments.csv"], "Process installments payments"),
+    Step("credit_card_balance", credit_card_balance, ["credit_card_balance.csv"], "Process credit card balance"),
+]
+
+STEPS_BY_NAME = {step.name : step for step in STEPS}
+
+# Helpers and schemas used by the steps, a change in their code changes every step's key
+SHARED_SOURCES = [one_hot_encoder, installments_features, StreamingAggregation, aggregate_csv, schemas]
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Method used to calculate the digest of a file's content.
+
+    Parameters:
+    -----------------
+        path (str): Path of the file
+        block_size (int): Bytes read at a time
+
+    Returns:
+    -----------------
+        digest (str): Hexadecimal digest
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def step_spec(step):
+    """
+    Method used to get the specification of a step, its code and the code
+    of the helpers, the aggregations are defined in the step's code.
+
+    Parameters:
+    -----------------
+        step (Step): Step of the pipeline
+
+    Returns:
+    -----------------
+        spec (str): Source code the output depends on
+    """
+
+    return "\n".join(inspect.getsource(source) for source in [step.function] + SHARED_SOURCES)
+
+
+def write_artifact(df, path):
+    """
+    Method used to save the output of a step as an uncompressed Feather
+    file, the index is saved as a column.
+
+    Parameters:
+    -----------------
+        df (pandas.DataFrame): Output of the step
+        path (str): Path of the artifact
+    """
+
+    with atomic_path(path) as tmp_path:
+        feather.write_feather(df.rename_axis(INDEX_COLUMN).reset_index(), tmp_path, compression="uncompressed")
+
+
+def compute_step(name, datasets_path, num_rows, path):
+    """
+    Method used to compute a step and save its artifact, it runs in a worker
+    process: only the description of the output is sent back.
+
+    Parameters:
+    -----------------
+        name (str): Name of the step
+        datasets_path (str): Folder of the initial datasets
+        num_rows (int): Rows read by file, all by default
+        path (str): Path of the artifact
+
+    Returns:
+    -----------------
+        result (dict): Index's name, shape, seconds and peak RSS of the step
+    """
+
+    step = STEPS_BY_NAME[name]
+
+    with timer(step.title, memory=True) as stats:
+        df = step.function(num_rows, path=datasets_path)
+        write_artifact(df, path)
+
+    return {"index" : df.index.name, "shape" : list(df.shape), **stats}
+
+
+class Pipeline:
+    """
+    Class used to run the feature engineering step by step, the output of
+    each table is saved as a Feather artifact keyed by the hash of its input
+    files, of its specification and of its parameters. A step whose key is
+    unchanged is read from its artifact instead of being computed.
+
+    Parameters:
+    -----------------
+        datasets_path (str): Folder of the initial datasets
+        artifacts_path (str): Folder of the artifacts and of the manifest
+        num_rows (int): Rows read by file, all by default
+        force (bool): Computing all the steps again
+    """
+
+    def __init__(self, datasets_path=DATASETS_PATH, artifacts_path=ARTIFACTS_PATH, num_rows=None, force=False):
+        self.datasets_path = datasets_path
+        self.artifacts_path = artifacts_path
+        self.num_rows = num_rows
+        self.force = force
+
+        self.manifest_path = os.path.join(artifacts_path, "manifest.json")
+        self.manifest = {"files" : {}, "steps" : {}}
+
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+
+    def _save_manifest(self):
+        os.makedirs(self.artifacts_path, exist_ok=True)
+
+        with atomic_path(self.manifest_path) as tmp_path, open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=4)
+
+    def input_hash(self, path):
+        """
+        Method used to get the digest of an input file, it is only calculated
+        again when the size or the modification time of the file change.
+
+        Parameters:
+        -----------------
+            path (str): Path of the input file
+
+        Returns:
+        -----------------
+            digest (str): Hexadecimal digest
+        """
+
+        stat = os.stat(path)
+        known = self.manifest["files"].get(path)
+
+        if known is None or known["size"] != stat.st_size or known["mtime"] != stat.st_mtime_ns:
+            known = {"size" : stat.st_size, "mtime" : stat.st_mtime_ns, "hash" : file_hash(path)}
+            self.manifest["files"][path] = known
+
+        return known["hash"]
+
+    def step_key(self, step):
+        """
+        Method used to calculate the key of a step's artifact.
+
+        Parameters:
+        -----------------
+            step (Step): Step of the pipeline
+
+        Returns:
+        -----------------
+            key (str): Digest of the inputs, the specification and the parameters
+        """
+
+        description = {
+            "step" : step.name,
+            "spec" : hashlib.blake2b(step_spec(step).encode(), digest_size=16).hexdigest(),
+            "numRows" : self.num_rows,
+            "inputs" : [self.input_hash(os.path.join(self.datasets_path, name)) for name in step.inputs],
+        }
+
+        return hashlib.blake2b(json.dumps(description, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    def is_cached(self, step, key):
+        entry = self.manifest["steps"].get(step.name)
+
+        return (
+            not self.force and entry is not None and entry["key"] == key
+            and os.path.isfile(os.path.join(self.artifacts_path, entry["path"]))
+        )
+
+    def artifact_path(self, step, key):
+        return os.path.join(self.artifacts_path, "{}_{}.feather".format(step.name, key[:16]))
+
+    def record(self, step, key, result):
+        """
+        Method used to record the artifact of a step in the manifest, the
+        artifact it replaces is removed.
+
+        Parameters:
+        -----------------
+            step (Step): Step of the pipeline
+            key (str): Key of the artifact
+            result (dict): Description of the output, see compute_step
+        """
+
+        name = os.path.basename(self.artifact_path(step, key))
+
+        previous = self.manifest["steps"].get(step.name)
+        if previous is not None and previous["path"] != name:
+            try:
+                os.remove(os.path.join(self.artifacts_path, previous["path"]))
+            except FileNotFoundError:
+                pass
+
+        self.manifest["steps"][step.name] = {"key" : key, "path" : name, **result}
+        self._save_manifest()
+
+    def load_artifact(self, step):
+        """
+        Method used to read the output of a step from its artifact.
+
+        Parameters:
+        -----------------
+            step (Step): Step of the pipeline
+
+        Returns:
+        -----------------
+            df (pandas.DataFrame): Output of the step, with its index
+        """
+
+        entry = self.manifest["steps"][step.name]
+        df = feather.read_feather(os.path.join(self.artifacts_path, entry["path"]))
+
+        return df.set_index(INDEX_COLUMN).rename_axis(entry["index"])
+
+    def memory_estimate(self, step):
+        """
+        Method used to estimate the peak memory of a step, the one measured
+        during its last run or a multiple of the size of its input files.
+
+        Parameters:
+        -----------------
+            step (Step): Step of the pipeline
+
+        Returns:
+        -----------------
+            estimate (int): Bytes
+        """
+
+        entry = self.manifest["steps"].get(step.name)
+
+        if entry is not None and entry.get("peakRss"):
+            return entry["peakRss"]
+
+        return MEMORY_BY_INPUT_BYTE * sum(
+            os.path.getsize(os.path.join(self.datasets_path, name)) for name in step.inputs
+        )
+
+    def compute(self, steps, keys, max_workers=None, memory_budget=None):
+        """
+        Method used to compute steps in parallel, each one in a new process.
+        A step is started only when the estimated memory of the running steps
+        and its own fits the budget, the biggest steps first; a step bigger
+        than the budget runs alone.
+
+        Parameters:
+        -----------------
+            steps (list): Steps to compute
+            keys (dict): Key of the artifact by step's name
+            max_workers (int): Steps running at the same time, by default the CPUs
+            memory_budget (int): Bytes, by default 80% of the memory available
+        """
+
+        if not steps:
+            return
+
+        os.makedirs(self.artifacts_path, exist_ok=True)
+
+        max_workers = max_workers or os.cpu_count() or 1
+        memory_budget = memory_budget or int(0.8 * psutil.virtual_memory().available)
+
+        pending = sorted(steps, key=self.memory_estimate, reverse=True)
+        running = {}
+
+        try:
+            while pending or running:
+                used = sum(estimate for _, estimate, _ in running.values())
+
+                for step in list(pending):
+                    if len(running) >= max_workers:
+                        break
+
+                    estimate = self.memory_estimate(step)
+                    if running and used + estimate > memory_budget:
+                        continue
+
+                    # A new process by step. Spawned, not forked: a forked worker
+                    # starts with the parent's memory, its peak RSS would include it
+                    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+                    future = executor.submit(
+                        compute_step, step.name, self.datasets_path, self.num_rows,
+                        self.artifact_path(step, keys[step.name])
+                    )
+                    running[future] = (step, estimate, executor)
+                    pending.remove(step)
+                    used += estimate
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    step, _, executor = running.pop(future)
+                    executor.shutdown()
+                    self.record(step, keys[step.name], future.result())
+        finally:
+            # After a failure, no worker outlives the run: the steps still
+            # running are waited for, their artifacts are kept for the next run
+            for future, (step, _, executor) in running.items():
+                future.cancel()
+                executor.shutdown(wait=True, cancel_futures=True)
+                if not future.cancelled() and future.exception() is None:
+                    self.record(step, keys[step.name], future.result())
+
+    def run(self, max_workers=None, memory_budget=None):
+        """
+        Method used to run all the steps and join the tables to the clients,
+        the steps whose artifact is up to date are skipped.
+
+        Parameters:
+        -----------------
+            max_workers (int): Steps running at the same time, by default the CPUs
+            memory_budget (int): Bytes, by default 80% of the memory available
+
+        Returns:
+        -----------------
+            df (pandas.DataFrame): Train and test clients with all the features
+        """
+
+        keys = {step.name : self.step_key(step) for step in STEPS}
+        steps = [step for step in STEPS if not self.is_cached(step, keys[step.name])]
+
+        with timer("Process {} of {} tables".format(len(steps), len(STEPS))):
+            self.compute(steps, keys, max_workers, memory_budget)
+
+        # The tables are independent until the joins on SK_ID_CURR
+        with timer("Join the tables", memory=True):
+            df = None
+
+            for step in STEPS:
+                result = self.load_artifact(step)
+
+                if df is None:
+                    df = result
+                else:
+                    df = df.join(result, how='left', on='SK_ID_CURR')
+
+                del result
+                gc.collect()
+
+        self.report(computed=[step.name for step in steps])
+
+        return df
+
+    def report(self, computed=()):
+        """
+        Method used to print the wall time and the peak RSS of each step,
+        measured during its last computation.
+
+        Parameters:
+        -----------------
+            computed (list): Names of the steps computed by this run
+        """
+
+        print("\n")
+        for step in STEPS:
+            entry = self.manifest["steps"][step.name]
+            print(">> {}{}".format(step.name, "" if step.name in computed else " (cached)"))
+            print("   {} df shape: {}".format(step.name, tuple(entry["shape"])))
+            if "seconds" in entry:
+                print("   done in {:.0f}s - peak RSS {:.0f} MB".format(entry["seconds"], entry["peakRss"] / 2**20))
+
+
+def main(debug=False, force=False, max_workers=None, memory_budget=None, datasets_path=DATASETS_PATH,
+         artifacts_path=ARTIFACTS_PATH):
+    """
+    Method used to get the same dataset as the notebook's main(), skipping
+    the steps already computed.
+
+    Parameters:
+    -----------------
+        debug (bool): Reading only 10000 rows by file
+        force (bool): Computing all the steps again
+        max_workers (int): Tables processed at the same time, by default the CPUs
+        memory_budget (int): Bytes, by default 80% of the memory available
+        datasets_path (str): Folder of the initial datasets
+        artifacts_path (str): Folder of the artifacts
+
+    Returns:
+    -----------------
+        df (pandas.DataFrame): Train and test clients with all the features
+    """
+
+    # To test with less data
+    num_rows = 10000 if debug else None
+
+    # The artifacts of the debug runs are kept apart
+    if debug:
+        artifacts_path = os.path.join(artifacts_path, "debug")
+
+    df = Pipeline(datasets_path, artifacts_path, num_rows, force).run(max_workers, memory_budget)
+
+    # Calculating the size of the dataset on memory
+    print("\n")
+    result = memory_usage(df)
+    print(">> Dataset on memory")
+    print("  ", result)
+
+    return df
+
+
+if __name__ == "__main__":
+    # python pipeline.py [--debug] [--force] [--workers=2] [--memory-gb=8]
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    memory_gb = options.get("memory-gb")
+
+    with timer("\n\nFull model run", memory=True):
+        main(
+            debug="--debug" in sys.argv, force="--force" in sys.argv,
+            max_workers=int(options.get("workers", 0)) or None,
+            memory_budget=int(float(memory_gb) * 2**30) if memory_gb else None,
+        )
@@ -0,0 +1,408 @@
+# General
+import os
+import sys
+import gc
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import psutil
+
+## Own specific functions
+from installments import installments_features
+from schemas import read_options, read_table
+from streaming import CHUNK_SIZE, aggregate_csv
+
+
+########################################################
+# Feature engineering of the Home Credit's tables
+########################################################
+# Based on the Kernel "LightGBM with Simple Features". These functions are the
+# only definition of the features: notebook-preprocessing.ipynb imports them
+# and pipeline.py runs them as cached steps.
+DATASETS_PATH = os.path.join("datasets", "initials_datasets")
+
+
+def peak_rss():
+    """
+    Method used to get the peak resident memory of the current process.
+
+    Returns:
+    -----------------
+        peak (int): Bytes
+    """
+
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return psutil.Process().memory_info().peak_wset
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextmanager
+def timer(title, memory=False):
+    t0 = time.time()
+    stats = {}
+    yield stats
+    stats["seconds"] = time.time() - t0
+
+    if memory:
+        stats["peakRss"] = peak_rss()
+        print("{} - done in {:.0f}s - peak RSS {:.0f} MB".format(title, stats["seconds"], stats["peakRss"] / 2**20))
+    else:
+        print("{} - done in {:.0f}s".format(title, stats["seconds"]))
+
+
+def one_hot_encoder(df, nan_as_category=True):
+    """
+    Method used to encode the categorical columns with get_dummies.
+
+    Parameters:
+    -----------------
+        df (pandas.DataFrame): Dataset to encode
+        nan_as_category (bool): Adding a column for the missing-values
+
+    Returns:
+    -----------------
+        (df, new_columns): Dataset encoded and the columns added
+    """
+
+    original_columns = list(df.columns)
+    categorical_columns = [col for col in df.columns if df[col].dtype.name in ('object', 'category')]
+    df = pd.get_dummies(df, columns=categorical_columns, dummy_na=nan_as_category)
+    new_columns = [c for c in df.columns if c not in original_columns]
+
+    return df, new_columns
+
+
+def application_train_test(num_rows=None, nan_as_category=False, path=DATASETS_PATH):
+    """
+    Method used to read and merge the train and test datasets, transform the
+    boolean and categorical features and add new features.
+
+    Parameters:
+    -----------------
+        num_rows (int): Rows read by file, all by default
+        nan_as_category (bool): Adding a column for the missing-values
+        path (str): Folder of the initial datasets
+
+    Returns:
+    -----------------
+        df (pandas.DataFrame): Train and test clients
+    """
+
+    # Read data and merge
+    df = read_table(os.path.join(path, "application_train.csv"), num_rows)
+    test_df = read_table(os.path.join(path, "application_test.csv"), num_rows)
+    print("Train samples: {}, test samples: {}".format(len(df), len(test_df)))
+    df = pd.concat([df, test_df]).reset_index()
+
+    # Optional: Remove 4 applications with XNA CODE_GENDER (train set)
+    df = df[df['CODE_GENDER'] != 'XNA']
+
+    # Categorical features with Binary encode (0 or 1; two categories)
+    for bin_feature in ['CODE_GENDER', 'FLAG_OWN_CAR', 'FLAG_OWN_REALTY']:
+        df[bin_feature], uniques = pd.factorize(df[bin_feature])
+
+    # Categorical features with One-Hot encode
+    df, cat_cols = one_hot_encoder(df, nan_as_category)
+
+    # NaN values for DAYS_EMPLOYED: 365.243 -> nan
+    df['DAYS_EMPLOYED'] = df['DAYS_EMPLOYED'].replace(365243, np.nan)
+
+    # Some simple new features (percentages)
+    df['DAYS_EMPLOYED_PERC'] = df['DAYS_EMPLOYED'] / df['DAYS_BIRTH']
+    df['INCOME_CREDIT_PERC'] = df['AMT_INCOME_TOTAL'] / df['AMT_CREDIT']
+    df['INCOME_PER_PERSON'] = df['AMT_INCOME_TOTAL'] / df['CNT_FAM_MEMBERS']
+    df['ANNUITY_INCOME_PERC'] = df['AMT_ANNUITY'] / df['AMT_INCOME_TOTAL']
+    df['PAYMENT_RATE'] = df['AMT_ANNUITY'] / df['AMT_CREDIT']
+
+    del test_df
+    gc.collect()
+
+    return df
+
+
+def bureau_and_balance(num_rows=None, nan_as_category=True, path=DATASETS_PATH, chunksize=CHUNK_SIZE):
+    """
+    Method used to aggregate by client the previous credits in others
+    finance institutions, and their monthly balances.
+
+    Parameters:
+    -----------------
+        num_rows (int): Rows read by file, all by default
+        nan_as_category (bool): Adding a column for the missing-values
+        path (str): Folder of the initial datasets
+        chunksize (int): Rows of bureau_balance.csv aggregated at a time
+
+    Returns:
+    -----------------
+        bureau_agg (pandas.DataFrame): Features indexed by SK_ID_CURR
+    """
+
+    # Read data
+    bureau = read_table(os.path.join(path, "bureau.csv"), num_rows)
+
+    # Categorical features with One-Hot encode
+    bureau, bureau_cat = one_hot_encoder(bureau, nan_as_category)
+
+    # Bureau balance: Perform aggregations by chunks (STATUS one-hot encoded) and merge with bureau.csv
+    bb_path = os.path.join(path, "bureau_balance.csv")
+    bb_aggregation = aggregate_csv(
+        bb_path, 'SK_ID_BUREAU', {'MONTHS_BALANCE': ['min', 'max', 'size']},
+        categorical=['STATUS'], nan_as_category=nan_as_category, num_rows=num_rows, chunksize=chunksize,
+        **read_options(bb_path)
+    )
+    bb_cat = bb_aggregation.categorical_columns
+    bb_agg = bb_aggregation.result()
+    bb_agg.columns = pd.Index([e[0] + "_" + e[1].upper() for e in bb_agg.columns.tolist()])
+    bureau = bureau.join(bb_agg, how='left', on='SK_ID_BUREAU')
+    bureau.drop(['SK_ID_BUREAU'], axis=1, inplace= True)
+    del bb_aggregation, bb_agg
+    gc.collect()
+
+    # Bureau and bureau_balance numeric features
+    num_aggregations = {
+        'DAYS_CREDIT': ['min', 'max', 'mean', 'var'],
+        'DAYS_CREDIT_ENDDATE': ['min', 'max', 'mean'],
+        'DAYS_CREDIT_UPDATE': ['mean'],
+        'CREDIT_DAY_OVERDUE': ['max', 'mean'],
+        'AMT_CREDIT_MAX_OVERDUE': ['mean'],
+        'AMT_CREDIT_SUM': ['max', 'mean', 'sum'],
+        'AMT_CREDIT_SUM_DEBT': ['max', 'mean', 'sum'],
+        'AMT_CREDIT_SUM_OVERDUE': ['mean'],
+        'AMT_CREDIT_SUM_LIMIT': ['mean', 'sum'],
+        'AMT_ANNUITY': ['max', 'mean'],
+        'CNT_CREDIT_PROLONG': ['sum'],
+        'MONTHS_BALANCE_MIN': ['min'],
+        'MONTHS_BALANCE_MAX': ['max'],
+        'MONTHS_BALANCE_SIZE': ['mean', 'sum']
+    }
+
+    # Bureau and bureau_balance categorical features
+    cat_aggregations = {}
+    for cat in bureau_cat: cat_aggregations[cat] = ['mean']
+    for cat in bb_cat: cat_aggregations[cat + "_MEAN"] = ['mean']
+
+    bureau_agg = bureau.groupby('SK_ID_CURR').agg({**num_aggregations, **cat_aggregations})
+    bureau_agg.columns = pd.Index(['BURO_' + e[0] + "_" + e[1].upper() for e in bureau_agg.columns.tolist()])
+
+    # Bureau: Active credits - using only numerical aggregations
+    active = bureau[bureau['CREDIT_ACTIVE_Active'] == 1]
+    active_agg = active.groupby('SK_ID_CURR').agg(num_aggregations)
+    active_agg.columns = pd.Index(['ACTIVE_' + e[0] + "_" + e[1].upper() for e in active_agg.columns.tolist()])
+    bureau_agg = bureau_agg.join(active_agg, how='left', on='SK_ID_CURR')
+    del active, active_agg
+    gc.collect()
+
+    # Bureau: Closed credits - using only numerical aggregations
+    closed = bureau[bureau['CREDIT_ACTIVE_Closed'] == 1]
+    closed_agg = closed.groupby('SK_ID_CURR').agg(num_aggregations)
+    closed_agg.columns = pd.Index(['CLOSED_' + e[0] + "_" + e[1].upper() for e in closed_agg.columns.tolist()])
+    bureau_agg = bureau_agg.join(closed_agg, how='left', on='SK_ID_CURR')
+
+    del closed, closed_agg, bureau
+    gc.collect()
+
+    return bureau_agg
+
+
+def previous_applications(num_rows=None, nan_as_category=True, path=DATASETS_PATH):
+    """
+    Method used to aggregate by client the previous credits in "Prêt à dépenser".
+
+    Parameters:
+    -----------------
+        num_rows (int): Rows read, all by default
+        nan_as_category (bool): Adding a column for the missing-values
+        path (str): Folder of the initial datasets
+
+    Returns:
+    -----------------
+        prev_agg (pandas.DataFrame): Features indexed by SK_ID_CURR
+    """
+
+    # Read data
+    prev = read_table(os.path.join(path, "previous_application.csv"), num_rows)
+
+    # Categorical features with One-Hot encode
+    prev, cat_cols = one_hot_encoder(prev, nan_as_category= True)
+
+    # Days 365.243 values -> nan
+    for col in ['DAYS_FIRST_DRAWING', 'DAYS_FIRST_DUE', 'DAYS_LAST_DUE_1ST_VERSION', 'DAYS_LAST_DUE', 'DAYS_TERMINATION']:
+        prev[col] = prev[col].replace(365243, np.nan)
+
+    # Add feature: value ask / value received percentage
+    prev['APP_CREDIT_PERC'] = prev['AMT_APPLICATION'] / prev['AMT_CREDIT']
+
+    # Previous applications numeric features
+    num_aggregations = {
+        'AMT_ANNUITY': ['min', 'max', 'mean'],
+        'AMT_APPLICATION': ['min', 'max', 'mean'],
+        'AMT_CREDIT': ['min', 'max', 'mean'],
+        'APP_CREDIT_PERC': ['min', 'max', 'mean', 'var'],
+        'AMT_DOWN_PAYMENT': ['min', 'max', 'mean'],
+        'AMT_GOODS_PRICE': ['min', 'max', 'mean'],
+        'HOUR_APPR_PROCESS_START': ['min', 'max', 'mean'],
+        'RATE_DOWN_PAYMENT': ['min', 'max', 'mean'],
+        'DAYS_DECISION': ['min', 'max', 'mean'],
+        'CNT_PAYMENT': ['mean', 'sum'],
+    }
+
+    # Previous applications categorical features
+    cat_aggregations = {}
+    for cat in cat_cols:
+        cat_aggregations[cat] = ['mean']
+
+    prev_agg = prev.groupby('SK_ID_CURR').agg({**num_aggregations, **cat_aggregations})
+    prev_agg.columns = pd.Index(['PREV_' + e[0] + "_" + e[1].upper() for e in prev_agg.columns.tolist()])
+
+    # Previous Applications: Approved Applications - only numerical features
+    approved = prev[prev['NAME_CONTRACT_STATUS_Approved'] == 1]
+    approved_agg = approved.groupby('SK_ID_CURR').agg(num_aggregations)
+    approved_agg.columns = pd.Index(['APPROVED_' + e[0] + "_" + e[1].upper() for e in approved_agg.columns.tolist()])
+    prev_agg = prev_agg.join(approved_agg, how='left', on='SK_ID_CURR')
+
+    # Previous Applications: Refused Applications - only numerical features
+    refused = prev[prev['NAME_CONTRACT_STATUS_Refused'] == 1]
+    refused_agg = refused.groupby('SK_ID_CURR').agg(num_aggregations)
+    refused_agg.columns = pd.Index(['REFUSED_' + e[0] + "_" + e[1].upper() for e in refused_agg.columns.tolist()])
+    prev_agg = prev_agg.join(refused_agg, how='left', on='SK_ID_CURR')
+
+    del refused, refused_agg, approved, approved_agg, prev
+    gc.collect()
+
+    return prev_agg
+
+
+def pos_cash(num_rows=None, nan_as_category=True, path=DATASETS_PATH):
+    """
+    Method used to aggregate by client the monthly balances of the home,
+    cash and consumer credits.
+
+    Parameters:
+    -----------------
+        num_rows (int): Rows read, all by default
+        nan_as_category (bool): Adding a column for the missing-values
+        path (str): Folder of the initial datasets
+
+    Returns:
+    -----------------
+        pos_agg (pandas.DataFrame): Features indexed by SK_ID_CURR
+    """
+
+    # Read data
+    pos = read_table(os.path.join(path, "POS_CASH_balance.csv"), num_rows)
+
+    # Categorical features with One-Hot encode
+    pos, cat_cols = one_hot_encoder(pos, nan_as_category=True)
+
+    # Features
+    aggregations = {
+        'MONTHS_BALANCE': ['max', 'mean', 'size'],
+        'SK_DPD': ['max', 'mean'],
+        'SK_DPD_DEF': ['max', 'mean']
+    }
+
+    for cat in cat_cols:
+        aggregations[cat] = ['mean']
+
+    pos_agg = pos.groupby('SK_ID_CURR').agg(aggregations)
+    pos_agg.columns = pd.Index(['POS_' + e[0] + "_" + e[1].upper() for e in pos_agg.columns.tolist()])
+
+    # Count pos cash accounts
+    pos_agg['POS_COUNT'] = pos.groupby('SK_ID_CURR').size()
+
+    del pos
+    gc.collect()
+
+    return pos_agg
+
+
+def installments_payments(num_rows=None, nan_as_category=True, path=DATASETS_PATH, chunksize=CHUNK_SIZE):
+    """
+    Method used to aggregate by client the history of payments, a row by
+    payment made or late payment.
+
+    Parameters:
+    -----------------
+        num_rows (int): Rows read, all by default
+        nan_as_category (bool): Adding a column for the missing-values
+        path (str): Folder of the initial datasets
+        chunksize (int): Rows aggregated at a time
+
+    Returns:
+    -----------------
+        ins_agg (pandas.DataFrame): Features indexed by SK_ID_CURR
+    """
+
+    # Features: Perform aggregations
+    aggregations = {
+        'NUM_INSTALMENT_VERSION': ['nunique'],
+        'DPD': ['max', 'mean', 'sum'],
+        'DBD': ['max', 'mean', 'sum'],
+        'PAYMENT_PERC': ['max', 'mean', 'sum', 'var'],
+        'PAYMENT_DIFF': ['max', 'mean', 'sum', 'var'],
+        'AMT_INSTALMENT': ['max', 'mean', 'sum'],
+        'AMT_PAYMENT': ['min', 'max', 'mean', 'sum'],
+        'DAYS_ENTRY_PAYMENT': ['max', 'mean', 'sum']
+    }
+
+    # Read data by chunks, the features are added to each chunk (no categorical feature in this table)
+    ins_path = os.path.join(path, "installments_payments.csv")
+    ins_aggregation = aggregate_csv(
+        ins_path, 'SK_ID_CURR', aggregations,
+        nan_as_category=nan_as_category, prepare=installments_features, num_rows=num_rows, chunksize=chunksize,
+        **read_options(ins_path)
+    )
+
+    ins_agg = ins_aggregation.result()
+    ins_agg.columns = pd.Index(['INSTAL_' + e[0] + "_" + e[1].upper() for e in ins_agg.columns.tolist()])
+
+    # Count installments accounts
+    ins_agg['INSTAL_COUNT'] = ins_aggregation.size
+
+    del ins_aggregation
+    gc.collect()
+
+    return ins_agg
+
+
+def credit_card_balance(num_rows=None, nan_as_category=True, path=DATASETS_PATH):
+    """
+    Method used to aggregate by client the monthly credit card balances.
+
+    Parameters:
+    -----------------
+        num_rows (int): Rows read, all by default
+        nan_as_category (bool): Adding a column for the missing-values
+        path (str): Folder of the initial datasets
+
+    Returns:
+    -----------------
+        cc_agg (pandas.DataFrame): Features indexed by SK_ID_CURR
+    """
+
+    # Read data
+    cc = read_table(os.path.join(path, "credit_card_balance.csv"), num_rows)
+
+    # Categorical features with One-Hot encode
+    cc, cat_cols = one_hot_encoder(cc, nan_as_category=True)
+
+    # General aggregations
+    cc.drop(['SK_ID_PREV'], axis= 1, inplace = True)
+    cc_agg = cc.groupby('SK_ID_CURR').agg(['min', 'max', 'mean', 'sum', 'var'])
+    cc_agg.columns = pd.Index(['CC_' + e[0] + "_" + e[1].upper() for e in cc_agg.columns.tolist()])
+
+    # Count credit card lines
+    cc_agg['CC_COUNT'] = cc.groupby('SK_ID_CURR').size()
+
+    del cc
+    gc.collect()
+
+    return cc_agg
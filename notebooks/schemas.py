@@ -0,0 +1,128 @@
+# General
+import os
+import pandas as pd
+
+
+########################################################
+# Compact dtypes of the Home Credit's raw tables
+########################################################
+# Identifiers, never missing and lower than 2**31
+KEYS = {"SK_ID_CURR" : "int32", "SK_ID_BUREAU" : "int32", "SK_ID_PREV" : "int32"}
+
+# Amounts, whatever the table
+FLOAT32_PREFIXES = ("AMT_",)
+
+APPLICATION_CATEGORICAL = [
+    "NAME_CONTRACT_TYPE", "CODE_GENDER", "FLAG_OWN_CAR", "FLAG_OWN_REALTY", "NAME_TYPE_SUITE",
+    "NAME_INCOME_TYPE", "NAME_EDUCATION_TYPE", "NAME_FAMILY_STATUS", "NAME_HOUSING_TYPE",
+    "OCCUPATION_TYPE", "WEEKDAY_APPR_PROCESS_START", "ORGANIZATION_TYPE", "FONDKAPREMONT_MODE",
+    "HOUSETYPE_MODE", "WALLSMATERIAL_MODE", "EMERGENCYSTATE_MODE",
+]
+
+PREVIOUS_APPLICATION_CATEGORICAL = [
+    "NAME_CONTRACT_TYPE", "WEEKDAY_APPR_PROCESS_START", "FLAG_LAST_APPL_PER_CONTRACT",
+    "NAME_CASH_LOAN_PURPOSE", "NAME_CONTRACT_STATUS", "NAME_PAYMENT_TYPE", "CODE_REJECT_REASON",
+    "NAME_TYPE_SUITE", "NAME_CLIENT_TYPE", "NAME_GOODS_CATEGORY", "NAME_PORTFOLIO",
+    "NAME_PRODUCT_TYPE", "CHANNEL_TYPE", "NAME_SELLER_INDUSTRY", "NAME_YIELD_GROUP",
+    "PRODUCT_COMBINATION",
+]
+
+# By file: columns read (None for all), categorical columns and other dtypes.
+# Only the columns used by the feature engineering are read.
+SCHEMAS = {
+    "application_train.csv" : {
+        "usecols" : None,
+        "categorical" : APPLICATION_CATEGORICAL,
+    },
+    "application_test.csv" : {
+        "usecols" : None,
+        "categorical" : APPLICATION_CATEGORICAL,
+    },
+    "bureau.csv" : {
+        "usecols" : [
+            "SK_ID_CURR", "SK_ID_BUREAU", "CREDIT_ACTIVE", "CREDIT_CURRENCY", "DAYS_CREDIT",
+            "CREDIT_DAY_OVERDUE", "DAYS_CREDIT_ENDDATE", "AMT_CREDIT_MAX_OVERDUE", "CNT_CREDIT_PROLONG",
+            "AMT_CREDIT_SUM", "AMT_CREDIT_SUM_DEBT", "AMT_CREDIT_SUM_LIMIT", "AMT_CREDIT_SUM_OVERDUE",
+            "CREDIT_TYPE", "DAYS_CREDIT_UPDATE", "AMT_ANNUITY",
+        ],
+        "categorical" : ["CREDIT_ACTIVE", "CREDIT_CURRENCY", "CREDIT_TYPE"],
+    },
+    "bureau_balance.csv" : {
+        "usecols" : None,
+        "categorical" : ["STATUS"],
+        "dtypes" : {"MONTHS_BALANCE" : "int16"},
+    },
+    "previous_application.csv" : {
+        "usecols" : [
+            "SK_ID_CURR", "AMT_ANNUITY", "AMT_APPLICATION", "AMT_CREDIT", "AMT_DOWN_PAYMENT",
+            "AMT_GOODS_PRICE", "HOUR_APPR_PROCESS_START", "RATE_DOWN_PAYMENT", "DAYS_DECISION",
+            "CNT_PAYMENT", "DAYS_FIRST_DRAWING", "DAYS_FIRST_DUE", "DAYS_LAST_DUE_1ST_VERSION",
+            "DAYS_LAST_DUE", "DAYS_TERMINATION",
+        ] + PREVIOUS_APPLICATION_CATEGORICAL,
+        "categorical" : PREVIOUS_APPLICATION_CATEGORICAL,
+    },
+    "POS_CASH_balance.csv" : {
+        "usecols" : ["SK_ID_CURR", "MONTHS_BALANCE", "SK_DPD", "SK_DPD_DEF", "NAME_CONTRACT_STATUS"],
+        "categorical" : ["NAME_CONTRACT_STATUS"],
+        "dtypes" : {"MONTHS_BALANCE" : "int16"},
+    },
+    "installments_payments.csv" : {
+        "usecols" : [
+            "SK_ID_CURR", "NUM_INSTALMENT_VERSION", "DAYS_INSTALMENT", "DAYS_ENTRY_PAYMENT",
+            "AMT_INSTALMENT", "AMT_PAYMENT",
+        ],
+        "categorical" : [],
+        # Small integers with missing-values, exact in float32
+        "dtypes" : {"NUM_INSTALMENT_VERSION" : "float32", "DAYS_INSTALMENT" : "float32", "DAYS_ENTRY_PAYMENT" : "float32"},
+    },
+    "credit_card_balance.csv" : {
+        "usecols" : None,
+        "categorical" : ["NAME_CONTRACT_STATUS"],
+    },
+}
+
+
+def read_options(csv_path):
+    """
+    Method used to get the options of read_csv applying the schema of a raw
+    table, the header of the file is read to know its columns.
+
+    Parameters:
+    -----------------
+        csv_path (str): Path of the CSV, its name identifies the schema
+
+    Returns:
+    -----------------
+        options (dict): usecols and dtype of read_csv
+    """
+
+    schema = SCHEMAS[os.path.basename(csv_path)]
+
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    if schema["usecols"] is not None:
+        columns = [col for col in columns if col in schema["usecols"]]
+
+    dtype = {col : "float32" for col in columns if col.startswith(FLOAT32_PREFIXES)}
+    dtype.update({col : KEYS[col] for col in columns if col in KEYS})
+    dtype.update({col : "category" for col in schema["categorical"] if col in columns})
+    dtype.update({col : value for col, value in schema.get("dtypes", {}).items() if col in columns})
+
+    return {"usecols" : list(columns), "dtype" : dtype}
+
+
+def read_table(csv_path, num_rows=None):
+    """
+    Method used to read a raw table with its compact dtypes, the columns not
+    used are not read.
+
+    Parameters:
+    -----------------
+        csv_path (str): Path of the CSV, e.g. datasets/initials_datasets/bureau.csv
+        num_rows (int): Rows read, all by default
+
+    Returns:
+    -----------------
+        df (pandas.DataFrame): Table
+    """
+
+    return pd.read_csv(csv_path, nrows=num_rows, **read_options(csv_path))
@@ -0,0 +1,282 @@
+# General
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+
+########################################################
+# Aggregations of large CSVs by chunks
+########################################################
+FUNCTIONS = ["min", "max", "size", "sum", "mean", "var", "nunique"]
+CHUNK_SIZE = 10**6
+
+
+class StreamingAggregation:
+    """
+    Class used to aggregate a table by key one chunk of rows at a time, like
+    groupby(key).agg(aggregations) on the whole table, without keeping the
+    rows in memory.
+
+    By key, only mergeable partial aggregates are kept: size, count, sum,
+    min, max, the sum of squared deviations for the variance (merged with
+    Chan's formula), the distinct values for nunique and the counts of the
+    categories of the categorical columns, whose one-hot encoded means are
+    calculated like one_hot_encoder followed by a mean.
+
+    Parameters:
+    -----------------
+        key (str): Column to group by, e.g. SK_ID_CURR
+        aggregations (dict): Column -> list of functions among FUNCTIONS
+        categorical (list): Categorical columns, aggregated as one-hot means
+        nan_as_category (bool): Adding a column for the missing-values of the
+                                categorical columns
+    """
+
+    def __init__(self, key, aggregations, categorical=(), nan_as_category=True):
+        for col, functions in aggregations.items():
+            unknown = sorted(set(functions) - set(FUNCTIONS))
+            if unknown:
+                raise ValueError("{}: aggregations {} can't be calculated by chunks".format(col, unknown))
+
+        self.key = key
+        self.aggregations = {col : list(functions) for col, functions in aggregations.items()}
+        self.categorical = list(categorical)
+        self.nan_as_category = nan_as_category
+
+        def columns(*functions):
+            return [col for col, col_functions in self.aggregations.items() if set(col_functions) & set(functions)]
+
+        self._columns = {
+            "count" : columns("sum", "mean", "var"),
+            "sum" : columns("sum", "mean", "var"),
+            "min" : columns("min"),
+            "max" : columns("max"),
+            "m2" : columns("var"),
+        }
+
+        self.size = None
+        self.rows = 0
+        self._partials = {}
+        self._distinct = {col : None for col in columns("nunique")}
+        self._categories = {col : None for col in self.categorical}
+
+    @staticmethod
+    def _merge(state, partial, function):
+        # The partials of each key are merged, the keys are kept sorted like groupby
+        if state is None:
+            return partial
+
+        return pd.concat([state, partial]).groupby(level=0).agg(function)
+
+    def _merge_m2(self, partial):
+        # Chan's formula to merge the sums of squared deviations of two sets
+        cols = self._columns["m2"]
+        state = self._partials
+
+        if "m2" not in state:
+            return partial["m2"]
+
+        index = state["m2"].index.union(partial["m2"].index)
+
+        n_a, s_a, m2_a = [state[name][cols].reindex(index, fill_value=0) for name in ["count", "sum", "m2"]]
+        n_b, s_b, m2_b = [partial[name][cols].reindex(index, fill_value=0) for name in ["count", "sum", "m2"]]
+
+        delta = s_b / n_b - s_a / n_a
+        correction = (delta**2 * n_a * n_b / (n_a + n_b)).where((n_a > 0) & (n_b > 0), 0)
+
+        return m2_a + m2_b + correction
+
+    def _merge_sum(self, partial):
+        # The sums of groupby are compensated (Kahan): after an infinite value,
+        # the next value gives NaN, the chunks' sums are merged the same way
+        if "sum" not in self._partials:
+            return partial["sum"]
+
+        index = self._partials["sum"].index.union(partial["sum"].index)
+
+        s_a = self._partials["sum"].reindex(index, fill_value=0)
+        s_b = partial["sum"].reindex(index, fill_value=0)
+        n_b = partial["count"].reindex(index, fill_value=0)
+
+        return (s_a + s_b).mask(np.isinf(s_a) & (n_b > 0))
+
+    def update(self, chunk):
+        """
+        Method used to add a chunk of rows to the aggregates.
+
+        Parameters:
+        -----------------
+            chunk (pandas.DataFrame): Rows of the table
+        """
+
+        # groupby drops the rows without key
+        chunk = chunk[chunk[self.key].notna()]
+        grouped = chunk.groupby(self.key)
+
+        partial = {}
+        if self._columns["sum"]:
+            partial["count"] = grouped[self._columns["count"]].count()
+            partial["sum"] = grouped[self._columns["sum"]].sum()
+        if self._columns["m2"]:
+            count = partial["count"][self._columns["m2"]]
+            partial["m2"] = (grouped[self._columns["m2"]].var(ddof=0) * count).where(count > 0, 0)
+        if self._columns["min"]:
+            partial["min"] = grouped[self._columns["min"]].min()
+        if self._columns["max"]:
+            partial["max"] = grouped[self._columns["max"]].max()
+
+        # Before the counts and the sums they depend on are merged
+        m2 = self._merge_m2(partial) if "m2" in partial else None
+        total = self._merge_sum(partial) if "sum" in partial else None
+
+        for name, function in [("count", "sum"), ("min", "min"), ("max", "max")]:
+            if name in partial:
+                self._partials[name] = self._merge(self._partials.get(name), partial[name], function)
+
+        if m2 is not None:
+            self._partials["m2"] = m2
+        if total is not None:
+            self._partials["sum"] = total
+
+        self.size = self._merge(self.size, grouped.size(), "sum")
+        self.rows += len(chunk)
+
+        for col in self._distinct:
+            pairs = chunk[[self.key, col]].dropna().drop_duplicates()
+            state = self._distinct[col]
+            self._distinct[col] = pairs if state is None else pd.concat([state, pairs]).drop_duplicates()
+
+        for col in self._categories:
+            counts = chunk.groupby([self.key, col], dropna=False).size().unstack(fill_value=0)
+            self._categories[col] = self._merge(self._categories[col], counts, "sum")
+
+    @property
+    def categorical_columns(self):
+        """
+        Names of the one-hot encoded columns, in the order of one_hot_encoder.
+        """
+
+        names = []
+
+        for col, counts in self._categories.items():
+            values = [] if counts is None else counts.columns
+            names += ["{}_{}".format(col, value) for value in sorted(value for value in values if not pd.isna(value))]
+            if self.nan_as_category:
+                names.append("{}_nan".format(col))
+
+        return names
+
+    def _column(self, col, function, index):
+        if function == "size":
+            return self.size
+
+        if function == "nunique":
+            return self._distinct[col].groupby(self.key).size().reindex(index, fill_value=0)
+
+        if function in ("min", "max", "sum"):
+            return self._partials[function][col]
+
+        count = self._partials["count"][col]
+        total = self._partials["sum"][col]
+
+        if function == "mean":
+            values = (total / count).where(count > 0)
+        else:
+            values = (self._partials["m2"][col] / (count - 1)).where(count > 1)
+
+        # Like groupby, float32 columns give float32 means and variances
+        return values.astype(np.float32) if total.dtype == np.float32 else values
+
+    def result(self):
+        """
+        Method used to calculate the aggregations of all the rows added.
+
+        Returns:
+        -----------------
+            agg (pandas.DataFrame): Aggregations indexed by key, with the same
+                                    columns (column, function) as groupby.agg
+        """
+
+        if self.size is None:
+            raise ValueError("no rows were aggregated")
+
+        index = self.size.index
+        columns = {}
+
+        for col, functions in self.aggregations.items():
+            for function in functions:
+                columns[(col, function)] = self._column(col, function, index)
+
+        # One-hot encoded means: rows of each category by rows of the key
+        for col, counts in self._categories.items():
+            counts = counts.reindex(index, fill_value=0)
+            for value in sorted(value for value in counts.columns if not pd.isna(value)):
+                columns[("{}_{}".format(col, value), "mean")] = counts[value] / self.size
+            if self.nan_as_category:
+                nan = [value for value in counts.columns if pd.isna(value)]
+                columns[("{}_nan".format(col), "mean")] = (counts[nan[0]] if nan else 0) / self.size
+
+        agg = pd.DataFrame(columns, index=index)
+        agg.index.name = self.key
+
+        return agg
+
+
+def aggregate_csv(path, key, aggregations, categorical=(), nan_as_category=True, prepare=None, num_rows=None,
+                  chunksize=CHUNK_SIZE, usecols=None, dtype=None):
+    """
+    Method used to aggregate a CSV by key, reading it by chunks.
+
+    Parameters:
+    -----------------
+        path (str): Path of the CSV
+        key (str): Column to group by
+        aggregations (dict): Column -> list of functions among FUNCTIONS
+        categorical (list): Categorical columns, aggregated as one-hot means
+        nan_as_category (bool): Adding a column for the missing-values
+        prepare (function): Applied to each chunk before the aggregation, it
+                            can only add features calculated row by row
+        num_rows (int): Rows read, all by default
+        chunksize (int): Rows read at a time
+        usecols (list): Columns read, all by default
+        dtype (dict): Dtypes of the columns, see schemas.read_options
+
+    Returns:
+    -----------------
+        aggregation (StreamingAggregation): Aggregates of all the rows
+    """
+
+    aggregation = StreamingAggregation(key, aggregations, categorical, nan_as_category)
+
+    # The categories are read as strings, whatever the values of a chunk
+    dtype = {**(dtype or {}), **{col : str for col in categorical}}
+    reader = pd.read_csv(path, nrows=num_rows, chunksize=chunksize, usecols=usecols, dtype=dtype)
+
+    for chunk in reader:
+        if prepare is not None:
+            chunk = prepare(chunk)
+        aggregation.update(chunk)
+
+    return aggregation
+
+
+if __name__ == "__main__":
+    # Comparing with groupby on a whole file:
+    # python streaming.py datasets/initials_datasets/bureau_balance.csv SK_ID_BUREAU MONTHS_BALANCE 100000
+    path, key, col = sys.argv[1], sys.argv[2], sys.argv[3]
+    chunksize = int(sys.argv[4]) if len(sys.argv) > 4 else CHUNK_SIZE
+    aggregations = {col : ["min", "max", "size", "sum", "mean", "var", "nunique"]}
+
+    t0 = time.time()
+    expected = pd.read_csv(path).groupby(key).agg(aggregations)
+    print("groupby - done in {:.0f}s".format(time.time() - t0))
+
+    t0 = time.time()
+    result = aggregate_csv(path, key, aggregations, chunksize=chunksize).result()
+    print("by chunks of {} rows - done in {:.0f}s".format(chunksize, time.time() - t0))
+
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+    print("max relative difference: {}".format(
+        float(np.nanmax(np.abs(result.to_numpy(float) - expected.to_numpy(float)) / np.abs(expected.to_numpy(float)).clip(1e-300)))
+    ))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of the notebooks are imported by name, like the notebooks do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
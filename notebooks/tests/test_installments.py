@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from installments import installments_features
+
+FEATURES = ['PAYMENT_PERC', 'PAYMENT_DIFF', 'DPD', 'DBD']
+
+
+def installments_features_apply(ins):
+    # The lambdas of the Kernel, the reference of installments_features
+    ins['PAYMENT_PERC'] = ins['AMT_PAYMENT'] / ins['AMT_INSTALMENT']
+    ins['PAYMENT_DIFF'] = ins['AMT_INSTALMENT'] - ins['AMT_PAYMENT']
+
+    ins['DPD'] = ins['DAYS_ENTRY_PAYMENT'] - ins['DAYS_INSTALMENT']
+    ins['DBD'] = ins['DAYS_INSTALMENT'] - ins['DAYS_ENTRY_PAYMENT']
+    ins['DPD'] = ins['DPD'].apply(lambda x: x if x > 0 else 0)
+    ins['DBD'] = ins['DBD'].apply(lambda x: x if x > 0 else 0)
+
+    return ins
+
+
+def synthetic_installments(n, days_dtype, rng):
+    days_instalment = -rng.integers(1, 3000, n).astype(float)
+    days_entry_payment = days_instalment + rng.integers(-60, 60, n)
+    amt_instalment = rng.choice([0.0, -0.0, 2500.5, 10000.0, 45000.0], n)
+    amt_payment = np.where(rng.random(n) < 0.5, amt_instalment, rng.uniform(0, 50000, n))
+
+    ins = pd.DataFrame({
+        "SK_ID_PREV": rng.integers(1000000, 2000000, n),
+        "SK_ID_CURR": rng.integers(100000, 110000, n),
+        "NUM_INSTALMENT_VERSION": rng.integers(0, 3, n).astype(days_dtype),
+        "DAYS_INSTALMENT": days_instalment.astype(days_dtype),
+        "DAYS_ENTRY_PAYMENT": days_entry_payment.astype(days_dtype),
+        "AMT_INSTALMENT": amt_instalment,
+        "AMT_PAYMENT": amt_payment,
+    })
+
+    # Missing payments, payments of zero and on the due day
+    ins.loc[rng.random(n) < 0.1, "DAYS_ENTRY_PAYMENT"] = np.nan
+    ins.loc[rng.random(n) < 0.05, "AMT_PAYMENT"] = np.nan
+    ins.loc[rng.random(n) < 0.05, ["AMT_PAYMENT", "AMT_INSTALMENT"]] = 0.0
+    on_time = rng.random(n) < 0.1
+    ins.loc[on_time, "DAYS_ENTRY_PAYMENT"] = ins.loc[on_time, "DAYS_INSTALMENT"]
+
+    return ins
+
+
+# float32 like read_table's schema, float64 like pd.read_csv
+@pytest.mark.parametrize("days_dtype", ["float32", "float64"])
+def test_installments_features_equal_the_lambdas(days_dtype):
+    ins = synthetic_installments(20000, days_dtype, np.random.default_rng(0))
+
+    expected = installments_features_apply(ins.copy())
+    result = installments_features(ins.copy())
+
+    # Values, NaN/inf positions, dtypes and columns' order
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+    # Signs of the zeros
+    for col in FEATURES:
+        assert np.array_equal(np.signbit(result[col].to_numpy()), np.signbit(expected[col].to_numpy())), col
+
+    assert result["PAYMENT_PERC"].isna().any() and np.isinf(result["PAYMENT_PERC"]).any()
+    assert (result["DPD"] == 0).any() and (result["DPD"] > 0).any()
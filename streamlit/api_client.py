@@ -0,0 +1,161 @@
+import time
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+########################################################
+# Client of the API used by the dashboard
+########################################################
+class ApiError(Exception):
+    """
+    Raised when an EndPoint can't be reached or returns an error.
+    """
+
+
+class ApiClient:
+    """
+    Class used to call the API with a pool of connections, timeouts and
+    retries with backoff. Independent EndPoints can be fetched in parallel,
+    the latency of each EndPoint is recorded.
+
+    The responses with an ETag are kept, they are revalidated with
+    If-None-Match and a 304 reuses the body already received.
+
+    Parameters:
+    -----------------
+        base_url (str): URL of the API, e.g. http://fastapi:8008
+        timeout (tuple): Seconds to connect and to read a response
+        retries (int): Retries of the GET on connection errors, 429 and 5xx
+        backoff_factor (float): Seconds of backoff, doubled at each retry
+        max_workers (int): Requests sent in parallel, also the pool's size
+        history (int): Latencies kept by EndPoint
+        max_etags (int): Responses kept to be revalidated
+    """
+
+    def __init__(self, base_url, timeout=(3.05, 30), retries=3, backoff_factor=0.3, max_workers=8, history=100,
+                 max_etags=256):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries, backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._latencies = defaultdict(lambda: deque(maxlen=history))
+        self._errors = defaultdict(int)
+        self._etags = OrderedDict()
+        self.max_etags = max_etags
+        self._lock = threading.Lock()
+
+    def get(self, endpoint, params=None, **path_params):
+        """
+        Method used to call an EndPoint and decode its JSON.
+
+        Parameters:
+        -----------------
+            endpoint (str): Path template, e.g. /api/clients/{id}, latencies
+                            are recorded by template
+            params (dict): Query parameters
+            **path_params: Values of the template, e.g. id=100001
+
+        Returns:
+        -----------------
+            response (dict): JSON of the response, ApiError on failure
+        """
+
+        started = time.perf_counter()
+
+        url = self.base_url + endpoint.format(**path_params)
+        key = (url, tuple(sorted((params or {}).items())))
+
+        with self._lock:
+            cached = self._etags.get(key)
+
+        try:
+            headers = {"If-None-Match" : cached[0]} if cached is not None else None
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+
+            if response.status_code == 304 and cached is not None:
+                result = cached[1]
+            else:
+                response.raise_for_status()
+                result = response.json()
+
+                if "ETag" in response.headers:
+                    with self._lock:
+                        self._etags[key] = (response.headers["ETag"], result)
+                        self._etags.move_to_end(key)
+                        while len(self._etags) > self.max_etags:
+                            self._etags.popitem(last=False)
+        except (requests.RequestException, ValueError) as error:
+            with self._lock:
+                self._errors[endpoint] += 1
+            raise ApiError("{}: {}".format(endpoint, error)) from error
+        finally:
+            with self._lock:
+                self._latencies[endpoint].append(1000 * (time.perf_counter() - started))
+
+        return result
+
+    def get_many(self, calls):
+        """
+        Method used to call independent EndPoints in parallel.
+
+        Parameters:
+        -----------------
+            calls (dict): Key -> (endpoint, params, path_params)
+
+        Returns:
+        -----------------
+            responses (dict): Key -> JSON of the response, or the ApiError raised
+        """
+
+        futures = {
+            key : self._pool.submit(self.get, endpoint, params, **path_params)
+            for key, (endpoint, params, path_params) in calls.items()
+        }
+
+        responses = {}
+        for key, future in futures.items():
+            try:
+                responses[key] = future.result()
+            except ApiError as error:
+                responses[key] = error
+
+        return responses
+
+    def latencies(self):
+        """
+        Method used to summarize the latencies recorded by EndPoint.
+
+        Returns:
+        -----------------
+            latencies (dict): EndPoint -> calls, errors, mean, p95 and last latency in ms
+        """
+
+        with self._lock:
+            recorded = {endpoint : list(values) for endpoint, values in self._latencies.items()}
+            errors = dict(self._errors)
+
+        return {
+            endpoint : {
+                "calls" : len(values),
+                "errors" : errors.get(endpoint, 0),
+                "meanMs" : float(np.mean(values)),
+                "p95Ms" : float(np.percentile(values, 95)),
+                "lastMs" : values[-1]
+            }
+            for endpoint, values in recorded.items()
+        }
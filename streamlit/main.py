@@ -1,14 +1,11 @@
+import os
 import streamlit as st
-import streamlit.components.v1 as components
-import requests
 from PIL import Image
 import plotly.express as px
 import plotly.graph_objects as go
-import plotly.figure_factory as ff
 import matplotlib.pyplot as plt
 import pandas as pd
-import joblib
-import shap
+from api_client import ApiClient, ApiError
 
 
 ########################################################
@@ -95,117 +92,95 @@ st.markdown(st_title_hr, unsafe_allow_html=True)
 
 
 ########################################################
-# Session for the API
+# Client of the API, shared by all the sessions
 ########################################################
-def fetch(session, url):
+API_URL = os.environ.get("API_URL", "http://fastapi:8008")
 
-    try:
-        result = session.get(url)
-        return result.json()
-    except Exception:
-        return {}
-
-session = requests.Session()
+@st.cache(allow_output_mutation=True)
+def api_client():
+    # Connections pool, timeouts and retries, see api_client.py
+    return ApiClient(API_URL)
 
 
 ########################################################
 # Functions to call the EndPoints
 ########################################################
 @st.cache
-def client():
-    # Getting clients Id
-    #response = fetch(session, f"http://fastapi:8008/api/clients")
-    response = requests.get("http://fastapi:8008/api/clients").json()
-    if response:
-        return response["clientsId"]
-    else:
-        return "Error"
-
-def client_details(id):
-    # Getting client's details
-    response = fetch(session, f"http://fastapi:8008/api/clients/{id}")
-    if response:
-        return response
-    else:
-        return "Error"
-
-def client_prediction(id):
-    # Getting client's prediction
-    response = fetch(session, f"http://fastapi:8008/api/predictions/clients/{id}")
-    if response:
-        return response
-    else:
-        return "Error"
-
-def clients_df(id):
-    # Getting client's df based on id
-    response = fetch(session, f"http://fastapi:8008/api/predictions/clients/shap/{id}")
-    if response:
-        return response
-    else:
-        return "Error"
+def clients_page(prefix, cursor=None, limit=50):
+    # Getting a page of clients Id starting with prefix
+    params = {"prefix" : prefix, "limit" : limit}
+    if cursor is not None:
+        params["cursor"] = cursor
+    return api_client().get("/api/clients", params)
+
+def clients_search(prefix, pages):
+    # Getting the first pages of clients Id starting with prefix
+    clients_id, cursor = [], None
+    for _ in range(pages):
+        page = clients_page(prefix, cursor)
+        clients_id += page["clientsId"]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    return clients_id, cursor is not None
+
+def client_dossier_call(id, fields):
+    # Client's details, prediction, explanation and percentiles in one request
+    return ("/api/clients/{id}/dossier", {"fields" : ",".join(fields)}, {"id" : id})
+
+def statistical_density_call(name):
+    # Density curves of a statistic (repaid and not repaid)
+    return ("/api/statistics/{name}/density", None, {"name" : name})
 
 @st.cache
-def statistical_ages():
-    # Getting General statistics about ages
-    response = fetch(session, f"http://fastapi:8008/api/statistics/ages")
-    if response:
-        return response
-    else:
-        return "Error"
-
-@st.cache
-def statistical_years_employed():
-    # Getting General statistics about ages
-    response = fetch(session, f"http://fastapi:8008/api/statistics/yearsEmployed")
-    if response:
-        return response
-    else:
-        return "Error"
-
-@st.cache
-def statistical_amt_credit():
-    # Getting General statistics amt credits
-    response = fetch(session, f"http://fastapi:8008/api/statistics/amtCredits")
-    if response:
-        return response
-    else:
-        return "Error"
+def statistical_density(name):
+    # Getting the density curves of a statistic (repaid and not repaid)
+    endpoint, params, path_params = statistical_density_call(name)
+    return api_client().get(endpoint, params, **path_params)
+
+# Session's key of each statistic's density
+DENSITIES = {
+    "ext_source_2_density" : "extSource2",
+    "ext_source_3_density" : "extSource3",
+    "ages_density" : "ages",
+    "years_employed_density" : "yearsEmployed",
+    "amt_credit_density" : "amtCredits",
+    "amt_income_density" : "amtIncomes"
+}
 
-@st.cache
-def statistical_amt_income():
-    # Getting General statistics amt incomes
-    response = fetch(session, f"http://fastapi:8008/api/statistics/amtIncomes")
-    if response:
-        return response
-    else:
-        return "Error"
 
-@st.cache
-def statistical_ext_source_2():
-    # Getting General statistics EXT SOURCE 2
-    response = fetch(session, f"http://fastapi:8008/api/statistics/extSource2")
-    if response:
-        return response
-    else:
-        return "Error"
+########################################################
+# To plot the density curves computed by the API
+########################################################
+def percentile_text(text, percentile):
+    # Adding the client's percentile among the current clients
+    if percentile is None:
+        return text
+    return "{} (percentile {:.0f})".format(text, percentile)
 
-@st.cache
-def statistical_ext_source_3():
-    # Getting General statistics EXT SOURCE 3
-    response = fetch(session, f"http://fastapi:8008/api/statistics/extSource3")
-    if response:
-        return response
-    else:
-        return "Error"
+def density_figure(density, group_labels, colors):
+    fig = go.Figure()
+    for key, label, color in zip(["repaid", "not_repaid"], group_labels, colors):
+        fig.add_trace(go.Scatter(x=density["x"], y=density[key], mode="lines",
+                                 name=label, line={"color": color}))
+    return fig
 
 
 ########################################################
-# To show the SHAP image
+# To plot the client's explanation (SHAP values) computed by the API
 ########################################################
-def st_shap(plot, height=None):
-    shap_html = f"<head>{shap.getjs()}</head><body>{plot.html()}</body>"
-    components.html(shap_html, height=height)
+def explanation_figure(explanation):
+    contributions = explanation["contributions"][::-1]
+    labels = ["Other features"] + [
+        "{} = {}".format(c["feature"], "NaN" if c["value"] is None else "{:,.3f}".format(c["value"]))
+        for c in contributions
+    ]
+    shap_values = [explanation["othersContribution"]] + [c["shapValue"] for c in contributions]
+    fig = go.Figure(go.Waterfall(orientation="h", base=explanation["baseValue"], y=labels, x=shap_values,
+                                 measure=["relative"] * len(shap_values),
+                                 increasing={"marker": {"color": "#E74C3C"}},
+                                 decreasing={"marker": {"color": "#27AE60"}}))
+    return fig
 
 
 ########################################################
@@ -262,10 +237,28 @@ else:
 
     with col1_cs:
 
+        # Out of the form, the list is refreshed at each search
+        search = st.text_input("Search a client Id", max_chars=18)
+        prefix = "".join(character for character in search if character.isdigit())
+
+        if st.session_state.get("clients_prefix") != prefix:
+            st.session_state["clients_prefix"] = prefix
+            st.session_state["clients_pages"] = 1
+
+        try:
+            clients_id, more_clients = clients_search(prefix, st.session_state["clients_pages"])
+        except ApiError as error:
+            st.error("The API is not available: {}".format(error))
+            st.stop()
+
+        if more_clients and st.button("More clients"):
+            st.session_state["clients_pages"] += 1
+            st.experimental_rerun()
+
         with st.form('Form1'):
 
             client_id = st.selectbox(
-                "Client Id list", client()
+                "Client Id list", clients_id
             )
             see_local_interpretation = st.checkbox("See local interpretation")
             see_stats = st.checkbox("See stats")
@@ -281,9 +274,36 @@ else:
 
         st.caption("&nbsp;")
 
-    if result:
+    if result and client_id is None:
+
+        st.warning("No client Id starts with **" + prefix + "**.")
+
+    elif result:
     
-        data = client_details(client_id)
+        # Only the sections needed by the options selected
+        fields = ["details", "prediction"]
+        if see_local_interpretation:
+            fields.append("explanation")
+        if see_stats:
+            fields.append("percentiles")
+
+        # The dossier and the densities not loaded yet are fetched in parallel
+        calls = {"dossier" : client_dossier_call(client_id, fields)}
+        if see_stats:
+            for key, name in DENSITIES.items():
+                if key not in st.session_state:
+                    calls[key] = statistical_density_call(name)
+
+        responses = api_client().get_many(calls)
+
+        errors = [str(response) for response in responses.values() if isinstance(response, ApiError)]
+        if errors:
+            st.error("The API is not available: {}".format("; ".join(errors)))
+            st.stop()
+
+        dossier = responses.pop("dossier")
+        st.session_state.update(responses)
+        data = dossier["details"]
         ccp, cli, cgfi, cgs1, cgs2 = (st.container() for i in range(5))
 
         with ccp:
@@ -291,7 +311,7 @@ else:
             client_information_title = '<h3 style="margin-bottom:0; padding: 0.5rem 0px 1rem;">📋 Client information</h3>'
             st.markdown(client_information_title, unsafe_allow_html=True)
 
-            prediction = client_prediction(client_id)
+            prediction = dossier["prediction"]
 
             repay = prediction["repay"]
             threshold = prediction["threshold"] * 100
@@ -383,11 +403,6 @@ else:
             
         if see_local_interpretation:
 
-            if "explainer" not in st.session_state:
-                st.session_state["explainer"] = joblib.load("shap_models/explainer_20220220.pkl")
-            if "shap_values" not in st.session_state:
-                st.session_state["shap_values"] = joblib.load("shap_models/shap_values_20220220.pkl")
-
             with ccp:
 
                 st.caption("&nbsp;")
@@ -395,13 +410,27 @@ else:
                 st.markdown(local_interpretation_title, unsafe_allow_html=True)
 
                 # Loading data
-                data_df = clients_df(client_id)
-                data_df = pd.read_json(data_df)
-
-                # visualize the first prediction's explanation (use matplotlib=True to avoid Javascript)
-                st_shap(shap.force_plot(st.session_state["explainer"].expected_value[1], 
-                                        st.session_state["shap_values"][1][data["shapPosition"],:], 
-                                        data_df.iloc[0,:]))
+                data_explanation = dossier["explanation"]
+
+                if data_explanation is None:
+                    st.warning("The local interpretation is not available.")
+                else:
+                    # Red features increase the risk of not repaying, green ones decrease it
+                    fig_explanation = explanation_figure(data_explanation)
+                    fig_explanation.update_layout(
+                        paper_bgcolor="white",
+                        font={
+                            "family": "sans serif"
+                        },
+                        height=400,
+                        margin=dict(
+                            l=50, r=50, b=0, t=20, pad=0
+                        ),
+                        xaxis_title="Base value {:,.3f} → output value {:,.3f}".format(
+                            data_explanation["baseValue"], data_explanation["outputValue"]
+                        )
+                    )
+                    st.plotly_chart(fig_explanation, config=config, use_container_width=True)
 
         if see_stats:
 
@@ -428,17 +457,10 @@ else:
 
                     st.caption("&nbsp;")
 
-                    if "ext_source_2" not in st.session_state:
-                        st.session_state["ext_source_2"] = statistical_ext_source_2()
-
-                    ext_source_2_repaid = st.session_state["ext_source_2"]["ext_source_2_repaid"]
-                    ext_source_2_not_repaid = st.session_state["ext_source_2"]["ext_source_2_not_repaid"]
-                    ext_source_2_repaid_list = [float(key) for key, val in ext_source_2_repaid.items() for _ in range(val)]
-                    ext_source_2_not_repaid_list = [float(key) for key, val in ext_source_2_not_repaid.items() for _ in range(val)]
+                    if "ext_source_2_density" not in st.session_state:
+                        st.session_state["ext_source_2_density"] = statistical_density("extSource2")
 
-                    fig_ext_source_2 = ff.create_distplot([ext_source_2_repaid_list, ext_source_2_not_repaid_list], 
-                                                group_labels, show_hist=False, show_rug=False, 
-                                                colors=colors)
+                    fig_ext_source_2 = density_figure(st.session_state["ext_source_2_density"], group_labels, colors)
                     fig_ext_source_2.update_layout(
                         paper_bgcolor="white",
                         font={
@@ -464,7 +486,7 @@ else:
                         }
                     )
                     fig_ext_source_2.add_vline(x=data["source2"], line_width=3,
-                                    line_dash="dash", line_color="blue", annotation_text="Client's ext source 2")
+                                    line_dash="dash", line_color="blue", annotation_text=percentile_text("Client's ext source 2", dossier["percentiles"]["extSource2"]))
 
                     col1_fi.plotly_chart(fig_ext_source_2, config=config, use_container_width=True)
             
@@ -476,17 +498,10 @@ else:
 
                     st.caption("&nbsp;")
 
-                    if "ext_source_3" not in st.session_state:
-                        st.session_state["ext_source_3"] = statistical_ext_source_3()
+                    if "ext_source_3_density" not in st.session_state:
+                        st.session_state["ext_source_3_density"] = statistical_density("extSource3")
 
-                    ext_source_3_repaid = st.session_state["ext_source_3"]["ext_source_3_repaid"]
-                    ext_source_3_not_repaid = st.session_state["ext_source_3"]["ext_source_3_not_repaid"]
-                    ext_source_3_repaid_list = [float(key) for key, val in ext_source_3_repaid.items() for _ in range(val)]
-                    ext_source_3_not_repaid_list = [float(key) for key, val in ext_source_3_not_repaid.items() for _ in range(val)]
-
-                    fig_ext_source_3 = ff.create_distplot([ext_source_3_repaid_list, ext_source_3_not_repaid_list], 
-                                                group_labels, show_hist=False, show_rug=False, 
-                                                colors=colors)
+                    fig_ext_source_3 = density_figure(st.session_state["ext_source_3_density"], group_labels, colors)
                     fig_ext_source_3.update_layout(
                         paper_bgcolor="white",
                         font={
@@ -512,7 +527,7 @@ else:
                         }
                     )
                     fig_ext_source_3.add_vline(x=data["source3"], line_width=3,
-                                    line_dash="dash", line_color="blue", annotation_text="Client's ext source 3")
+                                    line_dash="dash", line_color="blue", annotation_text=percentile_text("Client's ext source 3", dossier["percentiles"]["extSource3"]))
 
                     col2_fi.plotly_chart(fig_ext_source_3, config=config, use_container_width=True)
 
@@ -532,17 +547,10 @@ else:
 
                     st.caption("&nbsp;")
 
-                    if "ages" not in st.session_state:
-                        st.session_state["ages"] = statistical_ages()
-
-                    ages_repaid = st.session_state["ages"]["ages_repaid"]
-                    ages_not_repaid = st.session_state["ages"]["ages_not_repaid"]
-                    ages_repaid_list = [int(key) for key, val in ages_repaid.items() for _ in range(val)]
-                    ages_not_repaid_list = [int(key) for key, val in ages_not_repaid.items() for _ in range(val)]
+                    if "ages_density" not in st.session_state:
+                        st.session_state["ages_density"] = statistical_density("ages")
 
-                    fig_ages = ff.create_distplot([ages_repaid_list, ages_not_repaid_list], 
-                                                group_labels, show_hist=False, show_rug=False, 
-                                                colors=colors)
+                    fig_ages = density_figure(st.session_state["ages_density"], group_labels, colors)
                     fig_ages.update_layout(
                         paper_bgcolor="white",
                         font={
@@ -568,7 +576,7 @@ else:
                         }
                     )
                     fig_ages.add_vline(x=data["age"], line_width=3,
-                                    line_dash="dash", line_color="blue", annotation_text="Client's age")
+                                    line_dash="dash", line_color="blue", annotation_text=percentile_text("Client's age", dossier["percentiles"]["ages"]))
 
                     col1_gs_1.plotly_chart(fig_ages, config=config, use_container_width=True)
 
@@ -580,17 +588,10 @@ else:
 
                     st.caption("&nbsp;")
                     
-                    if "years_employed" not in st.session_state:
-                        st.session_state["years_employed"] = statistical_years_employed()
-
-                    years_employed_repaid = st.session_state["years_employed"]["years_employed_repaid"]
-                    years_employed_not_repaid = st.session_state["years_employed"]["years_employed_not_repaid"]
-                    years_employed_repaid_list = [int(key) for key, val in years_employed_repaid.items() for _ in range(val)]
-                    years_employed_not_repaid_list = [int(key) for key, val in years_employed_not_repaid.items() for _ in range(val)]
+                    if "years_employed_density" not in st.session_state:
+                        st.session_state["years_employed_density"] = statistical_density("yearsEmployed")
 
-                    fig_years_worked = ff.create_distplot([years_employed_repaid_list, years_employed_not_repaid_list], 
-                                                group_labels, show_hist=False, show_rug=False, 
-                                                colors=colors)
+                    fig_years_worked = density_figure(st.session_state["years_employed_density"], group_labels, colors)
 
                     fig_years_worked.update_layout(
                         paper_bgcolor="white",
@@ -617,7 +618,7 @@ else:
                         }
                     )
                     fig_years_worked.add_vline(x=data["yearsEmployed"], line_width=3,
-                                    line_dash="dash", line_color="blue", annotation_text="Years employed by the client")
+                                    line_dash="dash", line_color="blue", annotation_text=percentile_text("Years employed by the client", dossier["percentiles"]["yearsEmployed"]))
 
                     col2_gs_1.plotly_chart(fig_years_worked, config=config, use_container_width=True)
 
@@ -634,17 +635,10 @@ else:
 
                     st.caption("&nbsp;")
 
-                    if "amt_credit" not in st.session_state:
-                        st.session_state["amt_credit"] = statistical_amt_credit()
+                    if "amt_credit_density" not in st.session_state:
+                        st.session_state["amt_credit_density"] = statistical_density("amtCredits")
 
-                    amt_credit_repaid = st.session_state["amt_credit"]["amt_credit_repaid"]
-                    amt_credit_not_repaid = st.session_state["amt_credit"]["amt_credit_not_repaid"]
-                    amt_credit_repaid_list = [float(key) for key, val in amt_credit_repaid.items() for _ in range(val)]
-                    amt_credit_not_repaid_list = [float(key) for key, val in amt_credit_not_repaid.items() for _ in range(val)]
-
-                    fig_amt_credit = ff.create_distplot([amt_credit_repaid_list, amt_credit_not_repaid_list], 
-                                                group_labels, show_hist=False, show_rug=False, 
-                                                colors=colors)
+                    fig_amt_credit = density_figure(st.session_state["amt_credit_density"], group_labels, colors)
 
                     fig_amt_credit.update_layout(
                         paper_bgcolor="white",
@@ -671,7 +665,7 @@ else:
                         }
                     )
                     fig_amt_credit.add_vline(x=data["credit"], line_width=3,
-                                    line_dash="dash", line_color="blue", annotation_text="Client's AMT credit")
+                                    line_dash="dash", line_color="blue", annotation_text=percentile_text("Client's AMT credit", dossier["percentiles"]["amtCredits"]))
 
                     col1_gs_2.plotly_chart(fig_amt_credit, config=config, use_container_width=True)
 
@@ -684,17 +678,10 @@ else:
                     else:
                         xaxis_range = None
 
-                    if "amt_income" not in st.session_state:
-                        st.session_state["amt_income"] = statistical_amt_income()
-
-                    amt_income_repaid = st.session_state["amt_income"]["amt_income_repaid"]
-                    amt_income_not_repaid = st.session_state["amt_income"]["amt_income_not_repaid"]
-                    amt_income_repaid_list = [float(key) for key, val in amt_income_repaid.items() for _ in range(val)]
-                    amt_income_not_repaid_list = [float(key) for key, val in amt_income_not_repaid.items() for _ in range(val)]
+                    if "amt_income_density" not in st.session_state:
+                        st.session_state["amt_income_density"] = statistical_density("amtIncomes")
 
-                    fig_amt_income = ff.create_distplot([amt_income_repaid_list, amt_income_not_repaid_list], 
-                                                group_labels, show_hist=False, show_rug=False, 
-                                                colors=colors)
+                    fig_amt_income = density_figure(st.session_state["amt_income_density"], group_labels, colors)
 
                     fig_amt_income.update_layout(
                         paper_bgcolor="white",
@@ -724,6 +711,17 @@ else:
                         }
                     )
                     fig_amt_income.add_vline(x=data["anualIncome"], line_width=3,
-                                    line_dash="dash", line_color="blue", annotation_text="Client's AMT income")
+                                    line_dash="dash", line_color="blue", annotation_text=percentile_text("Client's AMT income", dossier["percentiles"]["amtIncomes"]))
+
+                    col2_gs_2.plotly_chart(fig_amt_income, config=config, use_container_width=True)
+
 
-                    col2_gs_2.plotly_chart(fig_amt_income, config=config, use_container_width=True)
\ No newline at end of file
+########################################################
+# Latency of the API by EndPoint
+########################################################
+with sb.expander("⏱️ API latency"):
+    latencies = api_client().latencies()
+    if latencies:
+        st.table(pd.DataFrame.from_dict(latencies, orient="index").round(1))
+    else:
+        st.caption("No request yet.")